@@ -0,0 +1,133 @@
+"""
+
+Anytime planning within a latency budget.
+
+A valid route is produced straight away from a greedy sweep over the
+strips of the lattice, then improved in a background thread. Every
+better route is published with its estimated mowing time, and the
+search stops at the deadline or when cancelled.
+
+"""
+
+import threading
+import time
+
+import numpy as np
+
+from optimise import TimeModel, reduce_turns, route_time
+from strips import plan_strips
+
+
+class AnytimePlan:
+    """The best route found so far by a background planner
+
+    Args:
+        points: The points from Quantise
+        height: The height of the robot
+        width: The width of the robot
+        overlap: The overlap used in Quantise
+        time_budget: Seconds allowed for planning
+        axis: 0 for left-right strips, 1 for up-down strips
+        start: The [x, y] position the route starts from
+        model: The time model used to score routes
+        on_improve: Called with the route and its score whenever a better
+            route is found
+        boundaries: The closed rings joins between strips must not cross
+    """
+
+    def __init__(self,
+                 points,
+                 height,
+                 width,
+                 overlap,
+                 time_budget,
+                 axis=0,
+                 start=None,
+                 model=TimeModel(),
+                 on_improve=None,
+                 boundaries=()):
+        self.deadline = time.monotonic() + time_budget
+        self.model = model
+        self.on_improve = on_improve
+        self.boundaries = boundaries
+        self.route = None
+        self.score = np.inf
+        self._lock = threading.Lock()
+        self._cancel = threading.Event()
+
+        # The greedy sweep gives a valid route before returning
+        self._candidates = [
+            plan_strips(points,
+                        height,
+                        width,
+                        overlap,
+                        axis,
+                        start=start,
+                        boundaries=boundaries)
+        ]
+        for route in self._candidates:
+            self._publish(route)
+
+        self._thread = threading.Thread(target=self._improve, daemon=True)
+        self._thread.start()
+
+    def _stop(self):
+        return self._cancel.is_set() or time.monotonic() > self.deadline
+
+    def _publish(self, route):
+        """Keeps the route if it is better than the best so far"""
+        score = route_time(route, self.model)
+        with self._lock:
+            if score >= self.score:
+                return
+            self.route = route
+            self.score = score
+        print("Improved route, estimated " + str(round(score, 1)) + " seconds")
+        if self.on_improve is not None:
+            self.on_improve(route, score)
+
+    def _improve(self):
+        """Reduces the turns of each candidate with a growing window
+
+        reduce_turns() checks the deadline between blocks of moves, so
+        the search ends soon after it.
+        """
+        window = 50
+        while not self._stop():
+            for i, route in enumerate(self._candidates):
+                new = reduce_turns(route,
+                                   self.model,
+                                   window=window,
+                                   stop=self._stop,
+                                   boundaries=self.boundaries)
+                self._candidates[i] = new
+                self._publish(new)
+                if self._stop():
+                    return
+            if window >= max(len(r) for r in self._candidates):
+                return
+            window *= 4
+
+    def best(self):
+        """The best route found so far and its score in seconds"""
+        with self._lock:
+            return self.route, self.score
+
+    def cancel(self):
+        """Stops improving the route"""
+        self._cancel.set()
+
+    def done(self):
+        """Whether the background search has finished"""
+        return not self._thread.is_alive()
+
+    def wait(self):
+        """Waits for the deadline, or the search to finish
+
+        Returns:
+            The best route found and its score in seconds
+        """
+        self._thread.join(max(self.deadline - time.monotonic(), 0))
+        self.cancel()
+        self._thread.join()
+        return self.best()
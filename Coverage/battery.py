@@ -0,0 +1,178 @@
+"""
+
+Splits a route into sub-routes that can each be mown on one charge.
+
+Each sub-route leaves the home point, mows a contiguous section of the
+route, and returns home before its estimated time exceeds the battery
+budget. If the robot has to stop part way a resume plan is worked out
+from the nearest unmown part of the route, so the route never needs
+to be planned again after a recharge.
+
+"""
+
+import numpy as np
+
+from optimise import TimeModel, turn_angles, turn_time
+
+
+def cumulative_time(route, model=TimeModel()):
+    """The estimated time taken to reach each point of a route
+
+    Args:
+        route: The [x, y] points of the route
+        model: The time model to use
+
+    Returns:
+        The time in seconds from the start to each point
+    """
+    route = np.asarray(route, dtype=float)
+    if len(route) == 0:
+        return np.empty(0)
+    travel = np.linalg.norm(np.diff(route, axis=0), axis=1) / model.speed
+    turns = turn_time(turn_angles(route), model)
+    return np.concatenate(([0], np.cumsum(travel + turns[:-1])))
+
+
+def heading_change(a, b):
+    """The absolute change in heading from each vector a to each vector b
+
+    Args:
+        a: The [dx, dy] of the first headings
+        b: The [dx, dy] of the second headings
+
+    Returns:
+        The angles in radians [0, pi], zero where either vector is zero
+    """
+    cross = a[..., 0] * b[..., 1] - a[..., 1] * b[..., 0]
+    dot = (a * b).sum(axis=-1)
+    return np.arctan2(np.abs(cross), dot)
+
+
+def partition(route, home, budget, model=TimeModel(), start=None):
+    """Splits a route into sub-routes that fit within a battery budget
+
+    The legs to and from home are assumed to be straight lines, and the
+    turns where they join the route are included in the time.
+
+    Args:
+        route: The [x, y] points of the route
+        home: The [x, y] of the charging point
+        budget: The time in seconds the robot can run on one charge
+        model: The time model to use
+        start: The [x, y] the first sub-route starts from, defaults to
+            home
+
+    Returns:
+        A list of dicts, one per sub-route, holding the first and last
+        index of the route mown, the points including the legs to and
+        from home, and the estimated time
+    """
+    route = np.asarray(route, dtype=float)
+    home = np.asarray(home, dtype=float)
+    start = home if start is None else np.asarray(start, dtype=float)
+    times = cumulative_time(route, model)
+    turns = turn_time(turn_angles(route), model)
+    back = np.linalg.norm(route - home, axis=1) / model.speed
+
+    plans = []
+    i = 0
+    origin = start
+    while i < len(route):
+        out = np.linalg.norm(route[i] - origin) / model.speed
+        # The turns where the route joins the legs to and from home
+        mow = times[i:] - times[i]
+        if i + 1 < len(route):
+            join = heading_change(route[i] - origin, route[i + 1] - route[i])
+            mow[1:] += turn_time(join, model) - turns[i]
+        prev = np.concatenate(([origin], route[i:-1]))
+        leave = turn_time(heading_change(route[i:] - prev, home - route[i:]),
+                          model)
+        # Mowing from i to j then returning home must fit in the budget
+        cost = out + mow + leave + back[i:]
+        over = np.flatnonzero(cost > budget)
+        if len(over) == 0:
+            j = len(route) - 1
+        elif over[0] <= 1:
+            raise ValueError("The route from point " + str(i) +
+                             " cannot be mown on one charge")
+        else:
+            j = i + over[0] - 1
+        legs = np.concatenate(([origin], route[i:j + 1], [home]))
+        plans.append({
+            "first": int(i),
+            "last": int(j),
+            "route": legs,
+            "time": float(cost[j - i])
+        })
+        if j == len(route) - 1:
+            break
+        # The next charge starts from the last point reached so the
+        # segment after it is still mown
+        origin = home
+        i = j
+
+    print("Route split into " + str(len(plans)) + " charges")
+    return plans
+
+
+def nearest_unmown(route, position, mown):
+    """Finds the nearest point on the unmown part of a route
+
+    Args:
+        route: The [x, y] points of the route
+        position: The robot's [x, y] position
+        mown: The number of points of the route already mown
+
+    Returns:
+        The index of the segment and the [x, y] point on it
+    """
+    route = np.asarray(route, dtype=float)
+    position = np.asarray(position, dtype=float)
+    a = route[max(mown - 1, 0):-1]
+    b = route[max(mown - 1, 0) + 1:]
+    if len(a) == 0:
+        return len(route) - 1, route[-1]
+    d = b - a
+    length = (d**2).sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        t = np.clip(((position - a) * d).sum(axis=1) / length, 0, 1)
+    t = np.nan_to_num(t)
+    closest = a + t[:, None] * d
+    k = int(np.argmin(np.linalg.norm(closest - position, axis=1)))
+    return max(mown - 1, 0) + k, closest[k]
+
+
+def resume(route, position, mown, home, budget, model=TimeModel()):
+    """Plans the rest of a route after the robot has stopped
+
+    The robot rejoins the route at the nearest unmown point and mows to
+    the end. It then goes home and starts again from the first unmown
+    point, mowing the part it skipped up to where it rejoined.
+
+    Args:
+        route: The [x, y] points of the route
+        position: The robot's [x, y] position
+        mown: The number of points of the route already mown
+        home: The [x, y] of the charging point
+        budget: The time in seconds the robot can run on one charge
+        model: The time model to use
+
+    Returns:
+        The sub-routes, as from partition, with indices into the
+        remaining route, which is the part after the point rejoined
+        followed by the part skipped
+    """
+    route = np.asarray(route, dtype=float)
+    k, point = nearest_unmown(route, position, mown)
+    after = np.concatenate(([point], route[k + 1:]))
+    plans = partition(after, home, budget, model, start=position)
+    if k < mown:
+        return plans
+    # The skipped part is not joined onto the end of the route, which
+    # would add an unplanned straight move between them
+    skipped = np.concatenate((route[mown:k + 1], [point]))
+    for plan in partition(skipped, home, budget, model):
+        plan["first"] += len(after)
+        plan["last"] += len(after)
+        plans.append(plan)
+    return plans
@@ -19,13 +19,32 @@ import matplotlib.pyplot as plt
 import networkx as nx
 import numpy as np
 import pyclipper
+import shapely
 import utm
+from scipy.spatial import cKDTree
 from shapely.geometry import LineString, Point, Polygon
 from surveytoolbox.bdc import bearing_distance_from_coordinates
 from surveytoolbox.cbd import coordinates_from_bearing_distance
 from surveytoolbox.config import BEARING, EASTING, ELEVATION, NORTHING
 from surveytoolbox.fmt_dms import format_as_dms
 
+from anytime import AnytimePlan
+from battery import partition
+from estimate import admit, estimate, fit_costs, record_stages, stage
+from fleet import plan_fleet
+from geofence import Geofence
+from optimise import TimeModel, optimise
+from plan import LATTICE, NOGO, PERIMETER, Plan, splice
+from plotting import render
+from repair import find_detours
+from simulate import ErrorModel, simulate, write_fixes
+from solvers import solve, suggest
+from streaming import first_band, stream_route
+from strips import CANDIDATES, boundary_tree, crossing, plan_strips, route_join
+from sweep import best_angle, rotate
+from tiling import plan_tiled, simplify, tile_size_for_budget
+from validate import validate_route
+
 
 def midpoint(p1, p2):
     return np.array([[(p1[0] + p2[0]) / 2, (p1[1] + p2[1]) / 2]])
@@ -142,35 +161,28 @@ def graph(points, height, width, overlap, up_down, left_right):
 
     g = nx.Graph()
     edges = list(tuple())
-    # Way too close, make the list some form of hash map
+    # Quantise steps the points by repeated addition, so neighbours are
+    # found by their lattice indices rather than by exact coordinates
     print("Processing " + str(len(points)) + " points into graph")
-    p = 0
-    for i in points:
-
-        left = ((i[0] - (width * overlap), i[1]))
-        if left in points:
-            edges.append(
-                tuple((i, left, math.dist([i[0], i[1]], [left[0], left[1]]) *
-                       left_right)))
-
-        right = ((i[0] + (width * overlap), i[1]))
-        if left in points:
-            edges.append(
-                tuple(
-                    (i, right, math.dist([i[0], i[1]], [right[0], right[1]]) *
-                     left_right)))
-
-        up = (([i[0], i[1] + height]))
-        if left in points:
-            edges.append(
-                tuple((i, up,
-                       math.dist([i[0], i[1]], [up[0], up[1]]) * up_down)))
-
-        down = (([i[0], i[1] - height]))
-        if left in points:
-            edges.append(
-                tuple((i, down,
-                       math.dist([i[0], i[1]], [down[0], down[1]]) * up_down)))
+    points = [tuple(i) for i in points]
+    if not points:
+        return g
+    step_x = width * overlap
+    min_x = min(i[0] for i in points)
+    min_y = min(i[1] for i in points)
+    lattice = {
+        (round((i[0] - min_x) / step_x), round((i[1] - min_y) / height)): i
+        for i in points
+    }
+    for (col, row), i in lattice.items():
+        # Only look right and up, every edge is found from its other end
+        right = lattice.get((col + 1, row))
+        if right is not None:
+            edges.append(tuple((i, right, math.dist(i, right) * left_right)))
+
+        up = lattice.get((col, row + 1))
+        if up is not None:
+            edges.append(tuple((i, up, math.dist(i, up) * up_down)))
 
     print("Adding " + str(len(edges)) + " edges to graph")
     for edge in edges:
@@ -286,13 +298,72 @@ def to_xy(perimeter, nogos):
     return [xy_shape, xy_nogos, zone_nums, zone_lets]
 
 
+# Scale used to convert to pyclipper's integer coordinates, matching
+# pyclipper.scale_to_clipper
+CLIPPER_SCALE = 2**32
+# Largest distance, in metres, rounded corners may deviate from a true
+# arc. pyclipper's default is in scaled units and so produces hundreds of
+# thousands of vertices per corner, all removed again by simplification
+ARC_TOLERANCE = 0.01
+
+
+def offset_rings(rings, delta, clipper_offset=None):
+    """Offsets closed rings by a distance using a single pyclipper offset
+
+    Coordinates are scaled to and from pyclipper's integers with NumPy
+    rather than pyclipper's per-point scaling functions.
+
+    Args:
+        rings: A list of closed [x, y] rings
+        delta: The offset distance, negative to shrink the ring
+        clipper_offset: A PyclipperOffset to reuse
+
+    Returns:
+        A list of the offset rings
+    """
+    if clipper_offset is None:
+        clipper_offset = pyclipper.PyclipperOffset()
+    clipper_offset.ArcTolerance = ARC_TOLERANCE * CLIPPER_SCALE
+    scaled_delta = delta * CLIPPER_SCALE
+    out = []
+    for ring in rings:
+        clipper_offset.Clear()
+        clipper_offset.AddPath(
+            np.rint(np.asarray(ring) * CLIPPER_SCALE).astype(np.int64),
+            pyclipper.JT_ROUND, pyclipper.ET_CLOSEDPOLYGON)
+        new_coordinates = clipper_offset.Execute(scaled_delta)
+        out.append(np.array(new_coordinates[0], dtype=float) / CLIPPER_SCALE)
+    return out
+
+
+def simplify_rings(rings, tolerance):
+    """Simplifies a list of rings in one vectorised shapely call
+
+    Args:
+        rings: A list of [x, y] rings
+        tolerance: The simplification tolerance in metres
+
+    Returns:
+        A list of the simplified rings
+    """
+    if len(rings) == 0:
+        return []
+    coords = np.concatenate(rings)
+    indices = np.repeat(np.arange(len(rings)), [len(r) for r in rings])
+    lines = shapely.simplify(shapely.linestrings(coords, indices=indices),
+                             tolerance)
+    coords, index = shapely.get_coordinates(lines, return_index=True)
+    return np.split(coords, np.flatnonzero(np.diff(index)) + 1)
+
+
 def inner_outer(xy_per, xy_nogos, width):
     """Generate inner bounday for perimeter and outer boundary(s) for
     nogo zone(s)
 
     The perimeter uses an inner offset to prevent going beyond the
     given bounds. The nogo zones uses an outer offset to prevent the
-    mower going out forbidden areas.
+    mower going out forbidden areas. Every outline is simplified
+    together, and plain NumPy rings are returned.
 
     Args:
         xy_per: The perimeter in UTM
@@ -302,48 +373,19 @@ def inner_outer(xy_per, xy_nogos, width):
     Returns:
         Returns the new perimeters to be used in TSP
     """
-    shape = np.append(xy_per, [xy_per[0, :]],
-                      axis=0)  # Append last to first to close off shape
-
     clipper_offset = pyclipper.PyclipperOffset()
-    coordinates_scaled = pyclipper.scale_to_clipper(shape)
 
-    clipper_offset.AddPath(coordinates_scaled, pyclipper.JT_ROUND,
-                           pyclipper.ET_CLOSEDPOLYGON)
-
-    new_coordinates = clipper_offset.Execute(
-        pyclipper.scale_to_clipper(-(width)))
-    inner = np.array(pyclipper.scale_from_clipper(new_coordinates)
-                     [0])  # New inner perimeter to avoid clipping outside
-    simple_per = geopandas.GeoSeries([
-        LineString(geopandas.points_from_xy(x=inner[:, 0], y=inner[:, 1])),
-    ])
-
-    simple_per = simple_per.simplify(0.1)
+    # Append last to first to close off each shape
+    # New inner perimeter to avoid clipping outside
+    [inner] = offset_rings([close_shape(xy_per)], -width, clipper_offset)
 
     # Do the same for each nogo-shape, but with a positive offset
     # rather too far away than too close
-    outer_nogos = list(list(list()))
-    for i in range(len(xy_nogos)):
-        temp = np.append(xy_nogos[i], [xy_nogos[i][0, :]], axis=0)
+    clipped = offset_rings([close_shape(nogo) for nogo in xy_nogos], width / 2,
+                           clipper_offset)
 
-        clipper_offset = pyclipper.PyclipperOffset()
-        coordinates_scaled = pyclipper.scale_to_clipper(temp)
-
-        clipper_offset.AddPath(coordinates_scaled, pyclipper.JT_ROUND,
-                               pyclipper.ET_CLOSEDPOLYGON)
-
-        new_coordinates = clipper_offset.Execute(
-            pyclipper.scale_to_clipper((width / 2)))
-        clipped = np.array(pyclipper.scale_from_clipper(new_coordinates)[0])
-        simple_nogo = geopandas.GeoSeries([
-            LineString(
-                geopandas.points_from_xy(x=clipped[:, 0], y=clipped[:, 1])),
-        ])
-        simple_nogo = simple_nogo.simplify(0.1)
-        outer_nogos.append(np.array(simple_nogo.geometry.iloc[0].coords))
-
-    return [np.array(simple_per.geometry.iloc[0].coords), outer_nogos]
+    simple = simplify_rings([inner] + clipped, 0.1)
+    return [simple[0], simple[1:]]
 
 
 def close_shape(shape):
@@ -351,10 +393,146 @@ def close_shape(shape):
     return shape
 
 
+def perimeter_passes(inner, outer_nogos):
+    """Generates the headland passes around the perimeter and nogo zones
+
+    Args:
+        inner: The inner perimeter
+        outer_nogos: The outer nogo boundaries
+
+    Returns:
+        A list of closed, ordered rings, the first being the perimeter
+    """
+    passes = []
+    for ring in [inner] + list(outer_nogos):
+        if not (ring[0] == ring[-1]).all():
+            ring = close_shape(ring)
+        passes.append(np.asarray(ring, dtype=float))
+    return passes
+
+
+def start_ring_at(ring, index):
+    """Rolls a closed ring so it starts and ends at the given vertex
+
+    Args:
+        ring: The closed ring
+        index: The index of the vertex to start from
+
+    Returns:
+        The rolled, closed ring
+    """
+    ring = np.roll(ring[:-1], -index, axis=0)
+    return close_shape(ring)
+
+
+def link_pass(ring, lattice_tree):
+    """Links a headland pass to the interior lattice
+
+    Args:
+        ring: The closed ring of the pass
+        lattice_tree: A cKDTree of the lattice points
+
+    Returns:
+        The ring rolled to start at the vertex nearest the lattice and the
+        index of the lattice point it links to
+    """
+    dist, idx = lattice_tree.query(ring[:-1])
+    k = int(np.argmin(dist))
+    return start_ring_at(ring, k), int(idx[k])
+
+
+def link_passes(route, passes, boundaries=()):
+    """Finds where each headland pass joins a route
+
+    Each pass joins the route where the two are nearest and the leg
+    between them crosses no boundary. If every leg nearby is blocked the
+    nearest is taken, and the leg follows the boundaries it crosses.
+
+    Args:
+        route: The [x, y] points of the route
+        passes: A list of closed rings
+        boundaries: The closed rings the legs must not cross
+
+    Returns:
+        A list of (index, points) pairs, sorted by the index of the route
+        point each pass joins at, the points leaving the route, going
+        around the pass, and coming back
+    """
+    if len(passes) == 0 or len(route) == 0:
+        return []
+    route = np.asarray(route, dtype=float)
+    tree = cKDTree(route)
+    if len(boundaries) > 0:
+        rings = [np.asarray(ring, dtype=float) for ring in boundaries]
+        area_tree, areas = boundary_tree(rings)
+    inserts = []
+    for ring in passes:
+        # The nearest few route points to every vertex, nearest first
+        dist, idx = tree.query(ring[:-1], k=min(CANDIDATES, len(route)))
+        dist = dist.reshape(len(ring) - 1, -1)
+        idx = idx.reshape(len(ring) - 1, -1)
+        v, c = np.unravel_index(np.argsort(dist, axis=None, kind="stable"),
+                                dist.shape)
+        r = idx[v, c]
+        best = 0
+        leg = np.empty((0, 2))
+        if len(boundaries) > 0:
+            crossed = crossing(area_tree, areas, route[r], ring[v])
+            clear = np.flatnonzero(crossed < 0)
+            if len(clear) > 0:
+                best = clear[0]
+            else:
+                leg = route_join(route[r[0]], ring[v[0]], rings, area_tree,
+                                 areas)
+        ring = start_ring_at(ring, v[best])
+        inserts.append((int(r[best]), np.concatenate((leg, ring, leg[::-1]))))
+    inserts.sort(key=lambda x: x[0])
+    return inserts
+
+
+def splice_passes(route, passes, boundaries=()):
+    """Inserts headland passes into a route where link_passes() joins them
+
+    The route leaves at the point each pass joins, travels around the
+    pass, and returns to the same point before continuing.
+
+    Args:
+        route: The [x, y] points of the route
+        passes: A list of closed rings
+        boundaries: The closed rings the legs to each pass must not cross
+
+    Returns:
+        The route with the passes inserted
+    """
+    return splice(route, link_passes(route, passes, boundaries))
+
+
 def main():
     height = 0.3
     width = 0.3
     overlap = 0.75
+    use_strips = True  # Plan over strips of the lattice rather than TSP
+    auto_angle = True  # Rotate the lattice to best fit the lawn
+    tiled = False  # Plan a tile at a time for very large areas
+    memory_budget = 512 * 1024**2  # Bytes available to tiled planning
+    tile_workers = 2  # Tiles planned at once
+    time_budget = None  # Seconds allowed to plan each pass, or None
+    streaming = False  # Save the route band by band as it is planned
+    band_rows = 20  # Lattice rows in each streamed band
+    home = None  # The [x, y] charging point, defaults to the route start
+    battery_budget = None  # Seconds of mowing per charge, or None
+    tsp_deadline = 60  # Seconds allowed for the TSP solvers
+    robots = 1  # Number of robots to split the lawn between
+    repair_gaps = True  # Add detours to cover gaps in the route
+    fast_plot = True  # Save a raster plot rather than buffering the route
+    admission = True  # Check the estimated cost before planning
+    memory_limit = 2 * 1024**3  # Bytes available to plan without tiling
+    plan_time_limit = None  # Seconds allowed for the whole plan, or None
+    stage_stats = "./stage_stats.json"  # Stage timings to fit estimates to
+    geofence_res = 0.05  # Pixel size of the geofence sent with the route
+    repair_res = 0.05  # Pixel size of the raster gaps are found on
+    fix_rate = 10  # Fixes per second of the simulated traversal, or None
+    time_model = TimeModel(speed=0.6, turn_penalty=1.0, reverse_penalty=3.0)
     test_shape = np.array([])
 
     nogos = list(np.array([[]]))
@@ -375,14 +553,65 @@ def main():
         print("Point's arent UTM - assuming already in GPS")
         xy_per = test_shape
         xy_nogos = nogos
+        zone_nums = zone_lets = [None]
 
     print("Creating Inner and Outer Perimeters")
     # Create inner perimeter and outter nogo boundaries
     [inner, outer_nogos] = inner_outer(xy_per, xy_nogos, width)
 
+    # Rotate the shapes so the lattice lies along the best sweep angle
+    angle = 0
+    origin = inner.mean(axis=0)
+    if auto_angle:
+        print("Selecting Sweep Angle")
+        angle, _ = best_angle(inner, height, width, overlap, outer_nogos)
+        inner = rotate(inner, -angle, origin)
+        outer_nogos = [rotate(nogo, -angle, origin) for nogo in outer_nogos]
+
+    tsp_methods = None
+    if admission:
+        print("Estimating Cost")
+        # Catch lawns too large for the graph and TSP before allocating them
+        nogo_area = sum(shapely.area(shapely.polygons(n)) for n in outer_nogos)
+        costs = fit_costs(stage_stats)
+        cost = estimate(shapely.area(shapely.polygons(inner)), nogo_area,
+                        height, width, overlap, costs)
+        # The tiles planned at once, should the lawn need tiling
+        tile = estimate(
+            tile_size_for_budget(height, width, overlap, memory_budget,
+                                 tile_workers)**2, 0, height, width, overlap,
+            costs)
+        tile_bytes = tile_workers * (tile["bytes"]["quantise"] +
+                                     tile["bytes"]["strips"])
+        # Only the methods learnt to suit a lawn of this size are offered
+        mode, tsp_methods = admit(cost,
+                                  memory_limit,
+                                  tsp_deadline,
+                                  suggest(cost["points"],
+                                          "./solver_stats.json"),
+                                  use_strips=use_strips,
+                                  time_limit=plan_time_limit,
+                                  tile_bytes=tile_bytes)
+        use_strips = use_strips or mode == "strips"
+        tiled = tiled or mode == "tiled"
+    if robots > 1 and (tiled or streaming):
+        # The fleet's regions are split from the whole lattice
+        raise ValueError("A fleet of " + str(robots) +
+                         " robots cannot be planned tiled or streamed")
+    stages = []
+
     print("Quantising")
     # Quantise the in perimeter, checking for outer nogo-zones
-    test_points = quantise(inner, height, width, overlap, outer_nogos)
+    # Tiled and streamed planning find the lattice points a tile or band
+    # at a time instead. Its peak memory is traced so every run adds a
+    # memory record to fit the estimates to
+    with stage("quantise", 0, stages):
+        if tiled or streaming:
+            lattice = set()
+        else:
+            lattice = quantise(inner, height, width, overlap, outer_nogos)
+    stages[-1]["points"] = len(lattice)
+    test_points = set(lattice)
 
     # Convert back to GPS - if needed
     # gps_points = xy_per
@@ -393,101 +622,297 @@ def main():
     #     gps_points[i, 0] = gps[0]
     #     gps_points[i, 1] = gps[1]
 
-    print("Appending Points")
-    # Append one point from inner perimeter and one from each nogo-zone
-    # allowing TSP to link them together
-
-    inner = np.append(inner, [inner[0, :]], axis=0)
-    for i in inner:
-        test_points.add((i[0], i[1]))
-    for nogo in outer_nogos:
-        for point in nogo:
-            test_points.add((point[0], point[1]))
-
-    # Need to refactor for the change to sets
-    # inner = np.append(inner, [inner[0, :]], axis=0)
-    # for i in range(len(outer_nogos)):
-    #     test_points = np.concatenate((test_points, outer_nogos[i]))
-
-    # test_points = np.append([inner[0, :]], test_points, axis=0)
+    print("Creating Perimeter Passes")
+    # The headland passes are kept out of the TSP, the perimeter is mown
+    # first and each nogo pass is spliced into the route at its nearest
+    # lattice point
+    passes = perimeter_passes(inner, outer_nogos)
+    inner = passes[0]
+    nogo_passes = passes[1:]
+    if streaming and not tiled:
+        # Link to the first band streamed, the first pass is up-down
+        band = first_band(inner, height, width, overlap, outer_nogos,
+                          band_rows, 1)
+        if len(band) > 0:
+            inner, _ = link_pass(inner, cKDTree(band))
+    elif len(lattice) > 0:
+        lattice_tree = cKDTree(list(lattice))
+        inner, _ = link_pass(inner, lattice_tree)
+
+    if robots > 1:
+        print("Planning Fleet")
+        routes, report = plan_fleet(lattice,
+                                    height,
+                                    width,
+                                    overlap,
+                                    robots,
+                                    model=time_model,
+                                    start=inner[-1],
+                                    boundaries=[inner] + nogo_passes)
+        # The first robot mows the perimeter, each nogo pass goes to the
+        # robot whose route passes nearest
+        routes[0] = np.concatenate((inner, routes[0]))
+        for ring in nogo_passes:
+            dists = [cKDTree(route).query(ring)[0].min() for route in routes]
+            n = int(np.argmin(dists))
+            routes[n] = splice_passes(routes[n], [ring], [inner] + nogo_passes)
+        for n, route in enumerate(routes):
+            route = rotate(route, angle, origin)
+            problems = validate_route(route, xy_per, nogos)
+            for seg, loc in zip(problems["segments"], problems["locations"]):
+                print("Robot " + str(n) + " segment " + str(seg) +
+                      " crosses a boundary at " + str(loc))
+            np.savetxt("./out_route_robot_" + str(n) + ".out",
+                       route,
+                       delimiter=',')
+        print(report)
+        return
 
     #######################################
     ####         Processing Data       ####
     #######################################
     print("Processing Data")
-    # Graph the points
-    test_graph = graph(test_points, height, width, overlap, 1.0, 1.5)
-    print(test_graph)
-
-    # Complete the TSP algorithm
-    tsp = nx.approximation.traveling_salesman_problem(test_graph, cycle=True)
-    tsp = np.array(tsp)
-    print("First TSP Complete")
-
-    # Adding some noise to a seperate set for testing of the traversal algorithm
-    final_noise = tsp  # keep original for testing
-    tsp = remove_intermediate_points(tsp, 10)  # reduced points
-    final_route = np.concatenate((inner, tsp))
-
-    # Graph the points
-    test_graph = graph(test_points, height, width, overlap, 1.5, 1.0)
-    print(test_graph)
-
-    # Complete the TSP algorithm
-    tsp = nx.approximation.traveling_salesman_problem(test_graph, cycle=True)
-    tsp = np.array(tsp)
-    print("Second TSP Complete")
-
-    # Adding some noise to a seperate set for testing of the traversal algorithm
-    final_noise = tsp  # keep original for testing
-    tsp = remove_intermediate_points(tsp, 10)  # reduced points
-    final_route = np.concatenate((final_route, tsp))
+    if streaming:
+        # The robot can start on the perimeter while the rest is planned
+        # The route is planned along the sweep angle, so each part is
+        # rotated back before it is saved
+        stream_file = open("./out_route_stream.out", "w")
+        np.savetxt(stream_file, rotate(inner, angle, origin), delimiter=',')
+        stream_file.flush()
+    # The route, recording the pass and kind of every point
+    plan = Plan(zone_number=zone_nums[0], zone_letter=zone_lets[0])
+    plan.append(inner, PERIMETER)
+    # Two overlapping passes, the first favouring up-down movement and the
+    # second left-right movement
+    time_saved = 0
+    for up_down, left_right, axis in [(1.0, 1.5, 1), (1.5, 1.0, 0)]:
+        if tiled:
+            # Plan a tile at a time to keep memory bounded by the tile size
+            final_noise = plan_tiled(inner,
+                                     height,
+                                     width,
+                                     overlap,
+                                     outer_nogos,
+                                     axis,
+                                     memory_budget=memory_budget,
+                                     workers=tile_workers,
+                                     start=plan.xy[-1])
+            tsp = simplify(final_noise)
+            start = len(plan)
+            plan.append(tsp, LATTICE)
+            if axis == 1:
+                final_noise = splice_passes(final_noise, nogo_passes,
+                                            [inner] + nogo_passes)
+                plan.splice(
+                    link_passes(tsp, nogo_passes, [inner] + nogo_passes), NOGO,
+                    start)
+            print("Pass Complete")
+            continue
+        elif streaming:
+            # Emit the route a band at a time, saving each chunk as soon as
+            # it is ready so the robot can start mowing
+            chunks = []
+            pending = list(nogo_passes) if axis == 1 else []
+            n = None
+            for chunk in stream_route(inner,
+                                      height,
+                                      width,
+                                      overlap,
+                                      outer_nogos,
+                                      band_rows,
+                                      axis,
+                                      start=plan.xy[-1]):
+                # Splice in the nogo passes this band has reached
+                reached = chunk[:, 1 - axis].max()
+                here = [p for p in pending if p[:, 1 - axis].min() <= reached]
+                pending = [
+                    p for p in pending if p[:, 1 - axis].min() > reached
+                ]
+                start = len(plan)
+                tsp = simplify(chunk)
+                n = plan.append(tsp, LATTICE, n)
+                plan.splice(link_passes(tsp, here, [inner] + nogo_passes),
+                            NOGO, start)
+                np.savetxt(stream_file,
+                           rotate(plan.xy[start:], angle, origin),
+                           delimiter=',')
+                stream_file.flush()
+                chunks.append(splice_passes(chunk, here,
+                                            [inner] + nogo_passes))
+            final_noise = np.concatenate(chunks)
+            print("Pass Complete")
+            continue
+        elif time_budget is not None:
+            # Return a quick route over the strips and improve it until the
+            # deadline, keeping the score of each better route
+            scores = []
+            tsp, score = AnytimePlan(
+                lattice,
+                height,
+                width,
+                overlap,
+                time_budget,
+                axis,
+                start=plan.xy[-1],
+                model=time_model,
+                on_improve=lambda route, score: scores.append(score),
+                boundaries=[inner] + nogo_passes).wait()
+            pass_saved = scores[0] - score
+        elif use_strips:
+            # Plan over straight strips of the lattice rather than every point
+            with stage("strips", len(lattice), stages, trace_memory=False):
+                tsp = plan_strips(lattice,
+                                  height,
+                                  width,
+                                  overlap,
+                                  axis,
+                                  start=plan.xy[-1],
+                                  boundaries=[inner] + nogo_passes)
+        else:
+            # Graph the points
+            with stage("graph", len(lattice), stages, trace_memory=False):
+                test_graph = graph(test_points, height, width, overlap,
+                                   up_down, left_right)
+            print(test_graph)
+
+            # Complete the TSP, running several methods against a deadline
+            tsp = solve(test_graph,
+                        deadline=tsp_deadline,
+                        methods=tsp_methods,
+                        stats_file="./solver_stats.json")
+            tsp = np.array(tsp)
+
+            # Start the tour from the lattice point nearest the route so far
+            _, r = cKDTree(tsp[:-1]).query(plan.xy[-1])
+            tsp = start_ring_at(tsp, r)
+        print("Pass Complete")
+
+        # Reorder the route to reduce the number of turns, which the
+        # anytime plan has already done within its budget
+        if time_budget is None:
+            tsp, pass_saved = optimise(tsp,
+                                       time_model,
+                                       boundaries=[inner] + nogo_passes)
+        time_saved += pass_saved
+
+        # Adding some noise to a seperate set for testing of the traversal algorithm
+        final_noise = tsp  # keep original for testing
+        tsp = remove_intermediate_points(tsp, 10)  # reduced points
+
+        # Mow around the nogo zones once, during the first pass
+        start = len(plan)
+        plan.append(tsp, LATTICE)
+        if axis == 1:
+            final_noise = splice_passes(final_noise, nogo_passes,
+                                        [inner] + nogo_passes)
+            plan.splice(link_passes(tsp, nogo_passes, [inner] + nogo_passes),
+                        NOGO, start)
+
+    record_stages(stage_stats, stages)
+
+    print("Estimated mowing time saved: " + str(round(time_saved, 1)) +
+          " seconds")
+
+    rings = [inner] + nogo_passes
+    tree, areas = boundary_tree(rings)
+    if repair_gaps:
+        # Cover any patches the route misses with short detours, finding
+        # them a tile of the raster at a time within the memory budget
+        detours, covered = find_detours(plan.xy, height, width, overlap, inner,
+                                        outer_nogos, repair_res, memory_budget)
+        print("Repairing " + str(len(detours)) + " gaps, " +
+              str(round(covered * 100, 1)) + "% covered")
+        if streaming:
+            # The streamed route can't change, so each detour is its own
+            # pass after the end of the route, streamed as it is added
+            for _, detour in detours:
+                start = len(plan)
+                n = plan.append(
+                    route_join(plan.xy[-1], detour[0], rings, tree, areas),
+                    LATTICE)
+                plan.append(detour, LATTICE, n)
+                np.savetxt(stream_file,
+                           rotate(plan.xy[start:], angle, origin),
+                           delimiter=',')
+                stream_file.flush()
+        else:
+            plan.splice(detours, LATTICE)
 
     # Need to define a home point, add to list, and ensure is same as start #
     # print(final_route[-1])
     # print(final_route[0])
     # assert ((final_route[-1] == final_route[0]).all())
-    final_route = np.append(final_route, [final_route[0]], axis=0)
+    # Return to the start without crossing a boundary
+    start = len(plan)
+    plan.append(route_join(plan.xy[-1], plan.xy[0], rings, tree, areas),
+                LATTICE)
+    plan.close()
+    if streaming:
+        np.savetxt(stream_file,
+                   rotate(plan.xy[start:], angle, origin),
+                   delimiter=',')
+        stream_file.close()
+
+    # Rotate everything back from the sweep angle
+    plan.xy[:] = rotate(plan.xy, angle, origin)
+    final_route = plan.xy
+    final_noise = rotate(final_noise, angle, origin)
+    tsp = rotate(tsp, angle, origin)
+    inner = rotate(inner, angle, origin)
+    outer_nogos = [rotate(nogo, angle, origin) for nogo in outer_nogos]
+
+    print("Validating")
+    # Check no segment of the route leaves the lawn or enters a nogo zone
+    problems = validate_route(final_route, xy_per, nogos)
+    for seg, loc in zip(problems["segments"], problems["locations"]):
+        print("Segment " + str(seg) + " crosses a boundary at " + str(loc))
 
     #######################################
     ####  Plotting bounds and points   ####
     #######################################
     print("Plotting")
-    # Display
-    s = geopandas.GeoSeries([
-        LineString(geopandas.points_from_xy(x=tsp[:, 0], y=tsp[:, 1])),
-        LineString(geopandas.points_from_xy(x=inner[:, 0], y=inner[:, 1])),
-    ])
-
-    f, ax = plt.subplots()
-    plt.axis('off')
-    s.buffer(width / 2).plot(alpha=0.5, ax=ax)
-    plt.plot(inner[:, 0], inner[:, 1])
-    plt.plot(xy_per[:, 0], xy_per[:, 1])
-    plt.plot(final_route[:, 0], final_route[:, 1], linewidth=0.1, color='red')
-
-    plt.scatter(final_route[:, 0],
-                final_route[:, 1],
-                linewidth=0.1,
-                color='green')
-    plt.scatter(final_route[0, 0], final_route[0, 1], color='blue')
-    for i in range(len(outer_nogos)):
-        # plt.plot(outer_nogos[i][:, 0],
-        #          outer_nogos[i][:, 1],
-        #          linewidth=0.5,
-        #          color='yellow')
-
-        geopandas.GeoSeries([
-            LineString(
-                geopandas.points_from_xy(x=outer_nogos[i][:, 0],
-                                         y=outer_nogos[i][:, 1])),
-        ]).buffer(width / 2).plot(alpha=0.5, ax=ax)
-        plt.plot(nogos[i][:, 0], nogos[i][:, 1], linewidth=1, color='red')
+    if fast_plot:
+        # Draw the coverage raster and a decimated route, headless
+        render("./test.png", final_route, width, xy_per, inner, nogos)
+    else:
+        # Display
+        s = geopandas.GeoSeries([
+            LineString(geopandas.points_from_xy(x=tsp[:, 0], y=tsp[:, 1])),
+            LineString(geopandas.points_from_xy(x=inner[:, 0], y=inner[:, 1])),
+        ])
 
-    try:
-        plt.show()
-    except:
-        plt.savefig("./test.png")
+        f, ax = plt.subplots()
+        plt.axis('off')
+        s.buffer(width / 2).plot(alpha=0.5, ax=ax)
+        plt.plot(inner[:, 0], inner[:, 1])
+        plt.plot(xy_per[:, 0], xy_per[:, 1])
+        plt.plot(final_route[:, 0],
+                 final_route[:, 1],
+                 linewidth=0.1,
+                 color='red')
+
+        plt.scatter(final_route[:, 0],
+                    final_route[:, 1],
+                    linewidth=0.1,
+                    color='green')
+        plt.scatter(final_route[0, 0], final_route[0, 1], color='blue')
+        for i in range(len(outer_nogos)):
+            # plt.plot(outer_nogos[i][:, 0],
+            #          outer_nogos[i][:, 1],
+            #          linewidth=0.5,
+            #          color='yellow')
+
+            geopandas.GeoSeries([
+                LineString(
+                    geopandas.points_from_xy(x=outer_nogos[i][:, 0],
+                                             y=outer_nogos[i][:, 1])),
+            ]).buffer(width / 2).plot(alpha=0.5, ax=ax)
+            plt.plot(nogos[i][:, 0], nogos[i][:, 1], linewidth=1, color='red')
+
+        try:
+            plt.show()
+        except:
+            plt.savefig("./test.png")
     #######################################
     #### Saving the points for testing ####
     #######################################
@@ -506,6 +931,24 @@ def main():
                final_route,
                delimiter=',')
     np.savetxt("./out_route.out", final_route, delimiter=',')
+    plan.save("./out_plan.npz")
+    # The mowable area, for checking every fix on the robot
+    fence = Geofence.build(inner,
+                           outer_nogos,
+                           geofence_res,
+                           memory_budget=memory_budget)
+    fence.save("./out_geofence.npz")
+
+    # Split the route into sub-routes that each fit on one charge
+    if battery_budget is not None:
+        if home is None:
+            home = final_route[0]
+        charges = partition(final_route, home, battery_budget, time_model)
+        for n, charge in enumerate(charges):
+            np.savetxt("./out_route_" + str(n) + ".out",
+                       charge["route"],
+                       delimiter=',')
+
     # Adding noise to simulate inaccuracy and errors
     for i in range(0, 100):
         fname = "../Map_Matching_Uniform/Noise_Tests/" + str(i) + "_route.out"
@@ -521,6 +964,14 @@ def main():
                 noise_route[j, :] = final_noise[j, :]
         np.savetxt(fname, noise_route, delimiter=',')
 
+    if fix_rate is not None:
+        # Time-stamped fixes of the robot driving the route, for testing
+        # the traversal at a realistic rate
+        fixes = simulate(final_route, fix_rate, time_model, error=ErrorModel())
+        write_fixes("../Map_Matching_Uniform/Noise_Tests/fixes.bin", fixes)
+        print("Simulated " + str(len(fixes)) + " fixes over " +
+              str(round(fixes["t"][-1], 1)) + " seconds")
+
     print(len(final_route))
 
     # Converting back to GPS (long, lat)
@@ -0,0 +1,268 @@
+"""
+
+Estimates the cost of planning before any of it is done.
+
+The lattice size of a lawn follows from its area and the spacing of
+the lattice alone, and the time and memory of each planning stage grow
+as a power of the lattice size. The powers are fitted to the timings
+of past stages, so a garden that would produce far too many points for
+the graph and the TSP can be caught, and planned a cheaper way, before
+anything is allocated.
+
+"""
+
+import json
+import math
+import os
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+import numpy as np
+
+from solvers import METHODS
+
+# [seconds coefficient, seconds power, bytes coefficient, bytes power]
+# of each stage against the number of lattice points, from calibrate()
+DEFAULT_COSTS = {
+    "quantise": [4.4e-05, 1.0, 72.0, 1.06],
+    "graph": [5.1e-05, 1.1, 1500.0, 1.0],
+    "strips": [2.2e-05, 0.82, 66.0, 1.0],
+    "tsp_christofides": [9.5e-04, 1.78, 1000.0, 1.97],
+    "tsp_greedy": [1.2e-04, 1.92, 610.0, 2.0],
+    "tsp_simulated_annealing": [9.7e-04, 1.56, 730.0, 1.98],
+    "tsp_threshold_accepting": [7.0e-04, 1.62, 730.0, 1.98]
+}
+
+
+@contextmanager
+def stage(name, n, records, trace_memory=True):
+    """Times a planning stage and records its peak memory
+
+    Args:
+        name: The name of the stage
+        n: The number of lattice points the stage works on
+        records: The list to append the stage's record to
+        trace_memory: Whether to trace the peak memory, which slows the
+            stage down
+    """
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        peak = None
+        if trace_memory:
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        records.append({
+            "stage": name,
+            "points": n,
+            "seconds": seconds,
+            "bytes": peak
+        })
+
+
+def record_stages(stats_file, records):
+    """Appends the stage records to the stats file"""
+    if stats_file is None:
+        return
+    stats = []
+    if os.path.exists(stats_file):
+        with open(stats_file) as f:
+            stats = json.load(f)
+    with open(stats_file, "w") as f:
+        json.dump(stats + records, f, indent=1)
+
+
+def fit_costs(stats_file):
+    """Fits the cost of each stage to the recorded stage timings
+
+    A straight line is fitted to the log of the cost against the log of
+    the lattice size. Every stage holds at least one record per point,
+    so memory never grows slower than the lattice, whatever small runs
+    with a large fixed overhead suggest. Stages with too few records
+    keep their defaults.
+
+    Args:
+        stats_file: The file of stage records
+
+    Returns:
+        The costs of each stage, as in DEFAULT_COSTS
+    """
+    costs = {name: list(cost) for name, cost in DEFAULT_COSTS.items()}
+    if stats_file is None or not os.path.exists(stats_file):
+        return costs
+    with open(stats_file) as f:
+        stats = json.load(f)
+
+    for name in costs:
+        records = [r for r in stats if r["stage"] == name and r["points"] > 1]
+        for i, key in ((0, "seconds"), (2, "bytes")):
+            found = [(r["points"], r[key]) for r in records if r[key]]
+            sizes = np.unique([n for n, _ in found])
+            if len(sizes) < 2:
+                continue
+            n, cost = np.log(np.array(found, dtype=float)).T
+            power, coef = np.polyfit(n, cost, 1)
+            if key == "bytes" and power < 1:
+                power = 1.0
+                coef = np.mean(cost - n)
+            costs[name][i:i + 2] = [float(np.exp(coef)), float(power)]
+    return costs
+
+
+def estimate(area, nogo_area, height, width, overlap, costs=DEFAULT_COSTS):
+    """Estimates the lattice size and the cost of each planning stage
+
+    Args:
+        area: The area of the inner perimeter in square metres
+        nogo_area: The total area of the outer nogo boundaries
+        height: The height of the robot
+        width: The width of the robot
+        overlap: The overlap used in Quantise
+        costs: The costs of each stage, from fit_costs()
+
+    Returns:
+        A dict of the number of lattice points, the number of edges in
+        the graph, and the estimated seconds and bytes of each stage
+    """
+    n = max(area - nogo_area, 0) / (height * width * overlap)
+    result = {
+        "points": int(n),
+        # Every point links to its four neighbours, each edge shared by two
+        "edges": int(2 * n),
+        "seconds": {},
+        "bytes": {}
+    }
+    for name, (t_coef, t_pow, m_coef, m_pow) in costs.items():
+        result["seconds"][name] = t_coef * n**t_pow
+        result["bytes"][name] = m_coef * n**m_pow
+    return result
+
+
+def admit(cost,
+          memory_limit,
+          tsp_deadline=60,
+          methods=None,
+          use_strips=False,
+          time_limit=None,
+          tile_bytes=None):
+    """Decides how to plan a lawn within the memory and time limits
+
+    The cheapest change that fits is made: the TSP methods which would
+    not fit are dropped, then the strips replace the TSP, then the area
+    is tiled. Each step trades route quality for a smaller cost.
+
+    Args:
+        cost: The estimate from estimate()
+        memory_limit: The memory available for planning in bytes
+        tsp_deadline: The time allowed for the TSP solvers
+        methods: The TSP methods wanted, defaults to all of them
+        use_strips: Whether the strips were already chosen over the TSP
+        time_limit: The time allowed for the whole plan, or None
+        tile_bytes: The estimated bytes of the tiles planned at once when
+            tiled, or None if unknown
+
+    Returns:
+        "tsp", "strips" or "tiled", and the TSP methods to run
+
+    Raises:
+        RuntimeError: If the lawn cannot be planned within the limits
+            even when tiled
+    """
+    seconds = cost["seconds"]
+    used = cost["bytes"]["quantise"]
+    mode = "strips" if use_strips else "tsp"
+    kept = []
+
+    if not use_strips:
+        graph_bytes = used + cost["bytes"]["graph"]
+        # Every method runs at once in its own process with its own copy
+        for name in methods or METHODS:
+            extra = cost["bytes"]["tsp_" + name] + cost["bytes"]["graph"]
+            if (seconds["tsp_" + name] <= tsp_deadline
+                    and graph_bytes + extra <= memory_limit):
+                kept.append(name)
+                graph_bytes += extra
+        if not kept:
+            mode = "strips"
+
+    if mode == "strips" and used + cost["bytes"]["strips"] > memory_limit:
+        mode = "tiled"
+        if tile_bytes is not None and tile_bytes > memory_limit:
+            raise RuntimeError("Planning a tile would take about " +
+                               str(round(tile_bytes)) +
+                               " bytes, over the limit of " +
+                               str(memory_limit))
+
+    if mode == "tsp":
+        total = seconds["quantise"] + seconds["graph"] + tsp_deadline
+        mode_name = "tsp (" + ", ".join(kept) + ")"
+    elif mode == "strips":
+        total = seconds["quantise"] + seconds["strips"]
+        mode_name = mode
+    else:
+        # Tiles find their own lattice points as they are planned
+        total = seconds["strips"]
+        mode_name = mode
+    if time_limit is not None and total > time_limit:
+        raise RuntimeError("Planning " + str(cost["points"]) +
+                           " points would take about " + str(round(total)) +
+                           " seconds, over the limit of " + str(time_limit))
+    print("Estimated " + str(cost["points"]) + " points, planning with " +
+          mode_name)
+    return mode, kept
+
+
+def calibrate(stats_file,
+              sizes=(10000, 40000, 160000),
+              tsp_sizes=(200, 400, 800),
+              methods=None):
+    """Times each stage on square lawns of increasing size
+
+    The TSP is run in this process so its memory can be traced. It is
+    timed on smaller lawns than the other stages, which need large
+    lawns before the fixed overheads stop dominating.
+
+    Args:
+        stats_file: The file to add the stage records to
+        sizes: The approximate numbers of lattice points to time
+            Quantise, the strips and the graph with
+        tsp_sizes: The approximate numbers of lattice points to time the
+            TSP with
+        methods: The TSP methods to time, defaults to all of them
+
+    Returns:
+        The costs fitted to all of the records in the stats file
+    """
+    import networkx as nx
+
+    from coverage import graph, quantise
+    from solvers import _method
+    from strips import plan_strips
+
+    height = width = 0.3
+    overlap = 0.75
+    records = []
+    for size in sorted(set(sizes) | set(tsp_sizes)):
+        side = math.sqrt(size * height * width * overlap)
+        shape = np.array([[0, 0], [side, 0], [side, side], [0, side], [0, 0]])
+        with stage("quantise", size, records):
+            points = quantise(shape, height, width, overlap, [])
+        n = len(points)
+        records[-1]["points"] = n
+        with stage("strips", n, records):
+            plan_strips(points, height, width, overlap)
+        with stage("graph", n, records):
+            g = graph(points, height, width, overlap, 1.0, 1.5)
+        if size not in tsp_sizes:
+            continue
+        for name in methods or METHODS:
+            with stage("tsp_" + name, n, records):
+                nx.approximation.traveling_salesman_problem(
+                    g, cycle=True, method=_method(name))
+    record_stages(stats_file, records)
+    return fit_costs(stats_file)
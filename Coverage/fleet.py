@@ -0,0 +1,132 @@
+"""
+
+Splits the mowing between several robots.
+
+The lattice from Quantise is divided into k contiguous bands of rows,
+balanced by the number of cells or the estimated mowing time. Each
+band is planned in its own process, with the same two overlapping
+passes as a single robot, giving one route per robot and a report of
+how evenly the work is shared.
+
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from optimise import TimeModel, route_time, turn_time
+from strips import find_strips, plan_strips
+
+
+def split_lattice(points,
+                  height,
+                  width,
+                  overlap,
+                  k,
+                  by="time",
+                  model=TimeModel()):
+    """Splits the lattice into k contiguous, balanced regions
+
+    Points are taken row by row, so each region is a band of whole or
+    part rows. Nogo zones are already removed from the lattice and
+    simply split the rows they cross.
+
+    Args:
+        points: The points from Quantise
+        height: The height of the robot
+        width: The width of the robot
+        overlap: The overlap used in Quantise
+        k: The number of robots
+        by: "cells" to balance the number of cells, or "time" to balance
+            the estimated mowing time including the turns at the end of
+            each strip
+        model: The time model to use
+
+    Returns:
+        A list of k arrays of [x, y] points
+    """
+    pts, starts, ends = find_strips(points, height, width, overlap, axis=0)
+    if len(pts) == 0:
+        return [np.empty((0, 2)) for _ in range(k)]
+
+    weight = np.ones(len(pts))
+    if by == "time":
+        weight *= width * overlap / model.speed
+        # Two half turns at the end of every strip
+        weight[ends] += float(turn_time(np.pi / 2, model)) * 2
+    elif by != "cells":
+        raise ValueError("Unknown balance " + by)
+
+    total = np.cumsum(weight)
+    cuts = np.searchsorted(total, total[-1] * np.arange(1, k) / k)
+    return np.split(pts, cuts)
+
+
+def _plan_region(args):
+    """Plans one robot's region, each pass starting where the last ended
+
+    Returns:
+        The route of the region
+    """
+    points, height, width, overlap, axes, start, boundaries = args
+    route = np.empty((0, 2))
+    for axis in axes:
+        here = route[-1] if len(route) else start
+        route = np.concatenate((route,
+                                plan_strips(points,
+                                            height,
+                                            width,
+                                            overlap,
+                                            axis,
+                                            start=here,
+                                            boundaries=boundaries)))
+    return route
+
+
+def plan_fleet(points,
+               height,
+               width,
+               overlap,
+               k,
+               by="time",
+               axes=(1, 0),
+               model=TimeModel(),
+               workers=None,
+               start=None,
+               boundaries=()):
+    """Plans one route per robot, each region planned concurrently
+
+    Args:
+        points: The points from Quantise
+        height: The height of the robot
+        width: The width of the robot
+        overlap: The overlap used in Quantise
+        k: The number of robots
+        by: "cells" or "time", what to balance the regions by
+        axes: The passes each robot makes in turn, 0 for left-right
+            strips and 1 for up-down strips
+        model: The time model to use
+        workers: The number of processes, defaults to k
+        start: The [x, y] position the first robot starts from
+        boundaries: The closed rings joins between strips must not cross
+
+    Returns:
+        The k routes and a report of the cells and estimated time of each
+        robot, and the ratio of the longest time to the mean
+    """
+    regions = split_lattice(points, height, width, overlap, k, by, model)
+    jobs = [(region, height, width, overlap, axes, start if n == 0 else None,
+             boundaries) for n, region in enumerate(regions)]
+    with ProcessPoolExecutor(max_workers=workers or k) as pool:
+        routes = list(pool.map(_plan_region, jobs))
+
+    times = np.array([route_time(route, model) for route in routes])
+    report = {
+        "cells": [len(region) for region in regions],
+        "time": times.tolist(),
+        "imbalance": float(times.max() / times.mean()) if times.any() else 1.0
+    }
+    print("Planned " + str(k) + " robots, longest " +
+          str(round(times.max(), 1)) + " seconds, imbalance " +
+          str(round(report["imbalance"], 2)))
+    return routes, report
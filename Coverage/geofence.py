@@ -0,0 +1,193 @@
+"""
+
+Answers whether a fix is safe to mow at, fast enough for every fix.
+
+The mowable area, inside the inner perimeter and outside every outer
+nogo boundary, is rasterised once on the server. It is kept as a
+bit-packed occupancy mask and a byte per pixel of clearance, so
+checking a fix is a single lookup rather than a test against every
+edge. The geofence is saved next to the route so the robot can load it.
+
+"""
+
+import math
+
+import numpy as np
+from scipy import ndimage
+
+from raster import BYTES_PER_PIXEL, make_grid, polygon_mask
+
+# Clearances are stored in whole pixels, up to this many
+MAX_CLEARANCE = 255
+
+
+class Geofence:
+    """A rasterised mowable area
+
+    Args:
+        origin: The [x, y] of the first pixel's corner
+        res: The size of a pixel in metres
+        shape: The (rows, cols) of the grid
+        bits: The occupancy mask, packed eight pixels to a byte along
+            each row
+        distance: The distance from each pixel's centre to the edge of
+            the mowable area, in whole pixels rounded down and at most
+            MAX_CLEARANCE, on whichever side the pixel lies
+    """
+
+    __slots__ = ("origin", "res", "shape", "bits", "distance")
+
+    def __init__(self, origin, res, shape, bits, distance):
+        self.origin = np.asarray(origin, dtype=float)
+        self.res = float(res)
+        self.shape = tuple(int(s) for s in shape)
+        self.bits = bits
+        self.distance = distance
+
+    @classmethod
+    def build(cls,
+              inner,
+              outer_nogos=(),
+              res=0.05,
+              margin=1.0,
+              memory_budget=512 * 1024**2):
+        """Rasterises the mowable area
+
+        The clearance is worked out a tile at a time, each tile seeing
+        far enough past its edges to find the largest clearance stored,
+        so only the geofence itself has to fit in memory.
+
+        Args:
+            inner: The inner perimeter
+            outer_nogos: The outer nogo boundaries
+            res: The size of a pixel in metres
+            margin: The distance in metres the grid extends past the
+                perimeter, so clearance is known just outside it
+            memory_budget: The memory available in bytes
+
+        Returns:
+            The Geofence
+
+        Raises:
+            MemoryError: If the geofence would not fit in the memory
+                budget at this pixel size
+        """
+        bounds = np.concatenate(
+            (inner.min(axis=0) - margin, inner.max(axis=0) + margin))
+        origin, res, (rows, cols) = make_grid(bounds, res)
+        pad = MAX_CLEARANCE + 1
+        # A tile and the pixels around it must fit beside the geofence
+        fence_bytes = rows * (math.ceil(cols / 8) + cols)
+        side = int(
+            math.sqrt(max(0, memory_budget - fence_bytes) /
+                      BYTES_PER_PIXEL)) - 2 * pad
+        if side < 8:
+            raise MemoryError("A geofence of " + str(rows) + " by " +
+                              str(cols) + " pixels of " + str(res) +
+                              " m does not fit in " + str(memory_budget) +
+                              " bytes")
+        # Tiles start on a whole byte of the packed rows
+        side -= side % 8
+
+        bits = np.empty((rows, math.ceil(cols / 8)), dtype=np.uint8)
+        distance = np.empty((rows, cols), dtype=np.uint8)
+        for r in range(0, rows, side):
+            for c in range(0, cols, side):
+                h = min(side, rows - r)
+                w = min(side, cols - c)
+                grid = (origin + [(c - pad) * res, (r - pad) * res], res,
+                        (h + 2 * pad, w + 2 * pad))
+                mask = polygon_mask(grid, inner, outer_nogos)
+                core = mask[pad:pad + h, pad:pad + w]
+                bits[r:r + h, c // 8:(c + w + 7) // 8] = np.packbits(core,
+                                                                     axis=1)
+                # The edge lies halfway between an inside and an outside
+                # pixel
+                inside = _pixels_to_edge(mask)
+                outside = _pixels_to_edge(~mask)
+                found = np.where(mask, inside, outside)[pad:pad + h,
+                                                        pad:pad + w]
+                distance[r:r + h,
+                         c:c + w] = np.minimum(np.floor(found - 0.5),
+                                               MAX_CLEARANCE)
+        return cls(origin, res, (rows, cols), bits, distance)
+
+    def _index(self, points):
+        """The row and column of each point, and whether it is on the grid"""
+        idx = np.floor((points - self.origin) / self.res).astype(np.int64)
+        on = ((idx >= 0) & (idx < [self.shape[1], self.shape[0]])).all(axis=1)
+        return idx[:, 1], idx[:, 0], on
+
+    def contains(self, x, y):
+        """Whether a single fix is inside the mowable area"""
+        col = int((x - self.origin[0]) // self.res)
+        row = int((y - self.origin[1]) // self.res)
+        if not (0 <= row < self.shape[0] and 0 <= col < self.shape[1]):
+            return False
+        return bool(self.bits[row, col >> 3] >> (7 - (col & 7)) & 1)
+
+    def clearance(self, x, y):
+        """The signed distance from a single fix to the edge of the area
+
+        Returns:
+            The distance in metres, positive inside the area, or -inf off
+            the grid
+        """
+        col = int((x - self.origin[0]) // self.res)
+        row = int((y - self.origin[1]) // self.res)
+        if not (0 <= row < self.shape[0] and 0 <= col < self.shape[1]):
+            return -np.inf
+        inside = self.bits[row, col >> 3] >> (7 - (col & 7)) & 1
+        found = float(self.distance[row, col]) * self.res
+        return found if inside else -found
+
+    def contains_batch(self, points):
+        """Whether each of many [x, y] fixes is inside the mowable area"""
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+        rows, cols, on = self._index(points)
+        rows = np.where(on, rows, 0)
+        cols = np.where(on, cols, 0)
+        bit = self.bits[rows, cols >> 3] >> (7 - (cols & 7)) & 1
+        return on & (bit == 1)
+
+    def clearance_batch(self, points):
+        """The signed distance from each of many [x, y] fixes to the edge
+
+        Returns:
+            The distances in metres, positive inside the area, and -inf
+            off the grid
+        """
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+        rows, cols, on = self._index(points)
+        rows = np.where(on, rows, 0)
+        cols = np.where(on, cols, 0)
+        inside = self.bits[rows, cols >> 3] >> (7 - (cols & 7)) & 1
+        found = self.distance[rows, cols] * self.res
+        return np.where(on, np.where(inside == 1, found, -found), -np.inf)
+
+    def save(self, fname):
+        """Saves the geofence to an .npz file"""
+        np.savez_compressed(fname,
+                            origin=self.origin,
+                            res=self.res,
+                            shape=self.shape,
+                            bits=self.bits,
+                            distance=self.distance)
+
+    @classmethod
+    def load(cls, fname):
+        """Loads a geofence saved by save()"""
+        with np.load(fname) as f:
+            return cls(f["origin"], f["res"], f["shape"], f["bits"],
+                       f["distance"])
+
+
+def _pixels_to_edge(mask):
+    """The distance in pixels from each set pixel to the nearest unset one
+
+    Where a tile has no unset pixel the edge is further away than any
+    clearance stored.
+    """
+    if mask.all():
+        return np.full(mask.shape, MAX_CLEARANCE + 1.0)
+    return ndimage.distance_transform_edt(mask)
@@ -0,0 +1,307 @@
+"""
+
+Post-processing of the coverage route to reduce mowing time.
+
+The TSP only minimises distance, but every turn the mower makes
+costs far more time than a metre of straight travel. This module
+scores a route with a simple time model and applies local moves
+which reduce the number of turns without dropping any points.
+
+"""
+
+import math
+from collections import namedtuple
+
+import numpy as np
+
+from strips import CANDIDATES, boundary_tree, crossing
+
+# The most gains worked out at once by reduce_turns()
+BLOCK_SIZE = 2**18
+
+TimeModel = namedtuple(
+    "TimeModel", [
+        "speed", "turn_rate", "turn_penalty", "reverse_penalty", "min_turn",
+        "reverse_angle"
+    ],
+    defaults=[0.6, 0.5, 1.0, 3.0,
+              math.radians(5),
+              math.radians(150)])
+TimeModel.__doc__ = """Parameters used to estimate the time to mow a route
+
+Args:
+    speed: Straight line speed in m/s
+    turn_rate: Rate of turning on the spot in rad/s
+    turn_penalty: Fixed time in seconds for stopping to make a turn
+    reverse_penalty: Extra time in seconds for turns sharp enough to need
+        reversing
+    min_turn: Turns below this angle (radians) are treated as straight
+    reverse_angle: Turns above this angle (radians) are treated as reversing
+"""
+
+
+def turn_angles(route):
+    """Calculates the turning angle at each vertex of a route
+
+    The first and last vertices have no turn. Repeated points are
+    treated as straight travel.
+
+    Args:
+        route: The [x, y] points of the route
+
+    Returns:
+        The absolute change in heading, in radians [0, pi], at each point
+    """
+    route = np.asarray(route, dtype=float)
+    angles = np.zeros(len(route))
+    if len(route) < 3:
+        return angles
+    a = route[1:-1] - route[:-2]
+    b = route[2:] - route[1:-1]
+    cross = a[:, 0] * b[:, 1] - a[:, 1] * b[:, 0]
+    dot = (a * b).sum(axis=1)
+    angles[1:-1] = np.arctan2(np.abs(cross), dot)
+    return angles
+
+
+def turn_time(angles, model=TimeModel()):
+    """The time taken to make the given turns
+
+    Args:
+        angles: Turning angles in radians
+        model: The time model to use
+
+    Returns:
+        The time in seconds for each turn
+    """
+    angles = np.asarray(angles, dtype=float)
+    turning = angles > model.min_turn
+    cost = np.where(turning, angles / model.turn_rate + model.turn_penalty,
+                    0.0)
+    return cost + np.where(angles > model.reverse_angle, model.reverse_penalty,
+                           0.0)
+
+
+def route_time(route, model=TimeModel()):
+    """Estimates the time taken to mow a route
+
+    Args:
+        route: The [x, y] points of the route
+        model: The time model to use
+
+    Returns:
+        The estimated time in seconds
+    """
+    route = np.asarray(route, dtype=float)
+    if len(route) < 2:
+        return 0.0
+    dist = np.linalg.norm(np.diff(route, axis=0), axis=1).sum()
+    return dist / model.speed + turn_time(turn_angles(route), model).sum()
+
+
+def count_turns(route, model=TimeModel()):
+    """Counts the turns in a route larger than the model's minimum turn
+
+    Args:
+        route: The [x, y] points of the route
+        model: The time model to use
+
+    Returns:
+        The number of turns
+    """
+    return int((turn_angles(route) > model.min_turn).sum())
+
+
+def _angle(prev, cur, nxt):
+    """Vectorised turning angle at cur, zero where prev or nxt is missing"""
+    a = cur - prev
+    b = nxt - cur
+    cross = a[..., 0] * b[..., 1] - a[..., 1] * b[..., 0]
+    dot = (a * b).sum(axis=-1)
+    return np.nan_to_num(np.arctan2(np.abs(cross), dot))
+
+
+def _reversal_gains(route, i, model, window, max_jump):
+    """Time saved by reversing route[i:j + 1] for every i and candidate j
+
+    Reversing a section keeps the turning angles inside it, so only
+    the two joining edges and the turns at either end change.
+
+    Args:
+        route: The [x, y] points of the route
+        i: The first point of each section
+        model: The time model to use
+        window: The longest section, in points, considered for reversal
+        max_jump: Joining edges may be up to this long (metres) even if
+            longer than the edges they replace
+
+    Returns:
+        The (len(i), window) last points of the sections, the time each
+        reversal saves and the number of turns it adds
+    """
+    n = len(route)
+    i = i[:, None]
+    j = i + np.arange(1, window + 1)
+    valid = j <= n - 2
+    j = np.where(valid, j, i)
+
+    pad = np.full((1, 2), np.nan)
+    padded = np.concatenate((pad, route, pad))
+
+    def pt(k):
+        # Index into the padded route so i - 2 and j + 2 may be missing
+        return padded[k + 1]
+
+    p_a2, p_a, p_i, p_i1 = pt(i - 2), pt(i - 1), pt(i), pt(i + 1)
+    p_j1, p_j, p_b, p_b2 = pt(j - 1), pt(j), pt(j + 1), pt(j + 2)
+
+    old_a = np.linalg.norm(p_i - p_a, axis=-1)
+    old_b = np.linalg.norm(p_b - p_j, axis=-1)
+    new_a = np.linalg.norm(p_j - p_a, axis=-1)
+    new_b = np.linalg.norm(p_b - p_i, axis=-1)
+
+    old_angles = np.stack(
+        np.broadcast_arrays(_angle(p_a2, p_a, p_i), _angle(p_a, p_i, p_i1),
+                            _angle(p_j1, p_j, p_b), _angle(p_j, p_b, p_b2)))
+    new_angles = np.stack(
+        np.broadcast_arrays(_angle(p_a2, p_a, p_j), _angle(p_a, p_j, p_j1),
+                            _angle(p_i1, p_i, p_b), _angle(p_i, p_b, p_b2)))
+
+    gain = ((old_a + old_b - new_a - new_b) / model.speed +
+            turn_time(old_angles, model).sum(axis=0) -
+            turn_time(new_angles, model).sum(axis=0))
+    added = ((new_angles > model.min_turn).sum(axis=0) -
+             (old_angles > model.min_turn).sum(axis=0))
+
+    # Don't create jumps longer than the edges being replaced, they may
+    # cross a nogo zone or leave the lawn
+    limit = np.maximum(old_a, old_b)
+    if max_jump is not None:
+        limit = np.maximum(limit, max_jump)
+    gain[(new_a > limit + 1e-9) | (new_b > limit + 1e-9) | ~valid] = -np.inf
+    return j, gain, added
+
+
+def _best_moves(route, i, model, window, max_jump, tree, areas):
+    """The best reversal from each of the given points, if it saves time
+
+    Moves which would add a turn are never chosen. Where the joining
+    edges are checked against the boundaries, only the CANDIDATES best
+    moves from each point are tried, so the check is a single query.
+
+    Returns:
+        The i, j and time saved of each move
+    """
+    j, gain, added = _reversal_gains(route, i, model, window, max_jump)
+    gain[added > 0] = -np.inf
+    rows = np.arange(len(i))
+    if tree is not None and gain.shape[1] > CANDIDATES:
+        keep = np.argpartition(-gain, CANDIDATES - 1, axis=1)[:, :CANDIDATES]
+        j = np.take_along_axis(j, keep, axis=1)
+        gain = np.take_along_axis(gain, keep, axis=1)
+    if tree is not None:
+        row, col = np.nonzero(gain > 1e-9)
+        mi, mj = i[row], j[row, col]
+        crossed = ((crossing(tree, areas, route[mi - 1], route[mj]) >= 0) |
+                   (crossing(tree, areas, route[mi], route[mj + 1]) >= 0))
+        gain[row[crossed], col[crossed]] = -np.inf
+    best = np.argmax(gain, axis=1)
+    keep = gain[rows, best] > 1e-9
+    return i[keep], j[keep, best[keep]], gain[keep, best[keep]]
+
+
+def reduce_turns(route,
+                 model=TimeModel(),
+                 window=50,
+                 max_jump=None,
+                 max_sweeps=100,
+                 min_gain=0.1,
+                 stop=None,
+                 boundaries=()):
+    """Reorders a route to reduce the time spent turning
+
+    Uses 2-opt moves, reversing a section of the route, as these keep
+    every point of the route and so preserve the coverage. Each sweep
+    evaluates every move over the window at once, then applies the
+    moves which save the most time and are far enough apart not to
+    change each other's gain. A move is never made if it adds a turn.
+    The start and end of the route are kept in place.
+
+    Args:
+        route: The [x, y] points of the route
+        model: The time model to use
+        window: The longest section, in points, considered for reversal
+        max_jump: Joining edges may be up to this long (metres) even if
+            longer than the edges they replace
+        max_sweeps: The maximum passes over the route
+        min_gain: Sweeping stops once a sweep saves less than this many
+            seconds
+        stop: A function returning True when the search should end early,
+            the route found so far is returned
+        boundaries: The closed rings the joining edges must not cross
+
+    Returns:
+        The reordered route
+    """
+    route = np.array(route, dtype=float)
+    if len(route) < 4:
+        return route
+
+    tree = areas = None
+    if len(boundaries) > 0:
+        tree, areas = boundary_tree(boundaries)
+
+    # Enough starting points at once to keep each block of gains small
+    block = max(1, BLOCK_SIZE // window)
+    # Only the moves near a reversal change, so later sweeps only look
+    # again at those and at the moves which lost out to a better one
+    todo = np.arange(1, len(route) - 2)
+    for _ in range(max_sweeps):
+        moves = []
+        for first in range(0, len(todo), block):
+            if stop is not None and stop():
+                return route
+            moves.append(
+                _best_moves(route, todo[first:first + block], model, window,
+                            max_jump, tree, areas))
+        mi, mj, mg = (np.concatenate(m) for m in zip(*moves))
+
+        # A move reads the points up to two either side of its section
+        used = np.zeros(len(route), dtype=bool)
+        again = np.zeros(len(route), dtype=bool)
+        saved = 0.0
+        for k in np.argsort(-mg):
+            i, j = mi[k], mj[k]
+            near = slice(max(i - 2, 0), j + 3)
+            if used[near].any():
+                again[i] = True
+                continue
+            used[near] = True
+            again[max(i - window - 2, 1):j + 3] = True
+            route[i:j + 1] = route[i:j + 1][::-1]
+            saved += mg[k]
+        todo = np.flatnonzero(again[:len(route) - 2])
+        if saved < min_gain or len(todo) == 0:
+            break
+
+    return route
+
+
+def optimise(route, model=TimeModel(), **kwargs):
+    """Reduces the turns of a route and reports the time saved
+
+    Args:
+        route: The [x, y] points of the route
+        model: The time model to use
+        kwargs: Passed to reduce_turns
+
+    Returns:
+        The optimised route and the estimated time saved in seconds
+    """
+    before = route_time(route, model)
+    new = reduce_turns(route, model, **kwargs)
+    after = route_time(new, model)
+    print("Turns reduced from " + str(count_turns(route, model)) + " to " +
+          str(count_turns(new, model)) + ", saving an estimated " +
+          str(round(before - after, 1)) + " seconds")
+    return new, before - after
@@ -0,0 +1,229 @@
+"""
+
+Holds a planned route and what is known about each of its points.
+
+The [x, y] of every vertex of the route is kept in one contiguous float
+array, 16 bytes a point, which can be handed to writers and encoders as
+a buffer without copying. The pass each point belongs to, and whether
+it comes from the perimeter, a nogo zone, or the lattice, is kept in a
+small table with one row for each run of points of the same pass and
+kind. The passes are recorded as they are added, so no later stage
+needs to work out where a pass starts or what a point is.
+
+Points are appended to a list of pieces and joined into one array only
+when the route is next read, so building a route a pass at a time
+copies it once rather than once for every pass.
+
+"""
+
+import numpy as np
+import utm
+
+# Kinds of vertex
+PERIMETER = 0
+NOGO = 1
+LATTICE = 2
+
+# A row of the run table: the index of the run's first point, its pass
+# and its kind
+RUN = np.dtype([("start", "<u8"), ("pass", "<u4"), ("kind", "u1")])
+
+
+def splice(route, detours):
+    """Inserts detours into a route
+
+    The route leaves at the point given for each detour, travels along
+    the detour, and returns to the same point before continuing.
+
+    Args:
+        route: The points of the route, of any dtype
+        detours: A list of (index, points) pairs, sorted by index, the
+            points having the same dtype as the route
+
+    Returns:
+        The route with the detours inserted
+    """
+    if len(detours) == 0:
+        return route
+    parts = []
+    last = 0
+    for r, points in detours:
+        parts.extend((route[last:r + 1], points, route[r:r + 1]))
+        last = r + 1
+    parts.append(route[last:])
+    return np.concatenate(parts)
+
+
+class Plan:
+    """A route made of passes, with the UTM zone it was planned in
+
+    Args:
+        xy: The [x, y] points of the route, if any
+        runs: The RUN table of the points, one row for each run of
+            points of the same pass and kind
+        zone_number: The UTM zone number of the coordinates
+        zone_letter: The UTM zone letter of the coordinates
+    """
+
+    __slots__ = ("_xy", "_pieces", "_size", "runs", "zone_number",
+                 "zone_letter")
+
+    def __init__(self, xy=None, runs=None, zone_number=None, zone_letter=None):
+        if xy is None:
+            xy = np.empty((0, 2))
+        if runs is None:
+            runs = np.empty(0, dtype=RUN)
+        self._xy = np.asarray(xy, dtype=float).reshape(-1, 2)
+        self._pieces = []
+        self._size = len(self._xy)
+        self.runs = runs
+        self.zone_number = zone_number
+        self.zone_letter = zone_letter
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def xy(self):
+        """The [x, y] points of the route, written in place"""
+        if self._pieces:
+            self._xy = np.concatenate([self._xy] + self._pieces)
+            self._pieces = []
+        return self._xy
+
+    def _lengths(self):
+        """The number of points in each run"""
+        return np.diff(self.runs["start"].astype(np.int64), append=self._size)
+
+    @property
+    def passes(self):
+        """The pass index of each point"""
+        return np.repeat(self.runs["pass"], self._lengths())
+
+    @property
+    def kinds(self):
+        """The kind of each point"""
+        return np.repeat(self.runs["kind"], self._lengths())
+
+    def next_pass(self):
+        """The index the next new pass will be given"""
+        if len(self.runs) == 0:
+            return 0
+        return int(self.runs["pass"].max()) + 1
+
+    def pass_starts(self):
+        """The index of the first point of each run of a pass"""
+        passes = self.runs["pass"]
+        change = np.flatnonzero(passes[1:] != passes[:-1]) + 1
+        keep = np.concatenate(([0], change)) if len(passes) else change
+        return self.runs["start"][keep].astype(np.int64)
+
+    def _add_run(self, start, pass_index, kind):
+        """Adds a row to the run table, unless it continues the last run"""
+        if len(self.runs) and self.runs["pass"][-1] == pass_index and \
+                self.runs["kind"][-1] == kind:
+            return
+        self.runs = np.append(self.runs,
+                              np.array([(start, pass_index, kind)], dtype=RUN))
+
+    def append(self, points, kind, pass_index=None):
+        """Adds points to the end of the route
+
+        Args:
+            points: The [x, y] points to add
+            kind: PERIMETER, NOGO or LATTICE
+            pass_index: The pass the points continue, defaults to a new
+                pass
+
+        Returns:
+            The pass index of the points
+        """
+        if pass_index is None:
+            pass_index = self.next_pass()
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+        if len(points):
+            self._add_run(self._size, pass_index, kind)
+            self._pieces.append(points)
+            self._size += len(points)
+        return pass_index
+
+    def splice(self, detours, kind, offset=0):
+        """Inserts detours into the route, each as a new pass
+
+        Args:
+            detours: A list of (index, [x, y] points) pairs, sorted by
+                index
+            kind: The kind of every detour's points
+            offset: Added to each index, so a detour can be found from
+                one pass of the route
+        """
+        if len(detours) == 0:
+            return
+        first = self.next_pass()
+        at = np.array([r + offset for r, _ in detours], dtype=np.int64)
+        # Each detour adds its points and a return to the point it left
+        added = np.array([len(points) + 1 for _, points in detours])
+        shift = np.concatenate(([0], np.cumsum(added)))
+        starts = self.runs["start"].astype(np.int64)
+        owner = np.searchsorted(starts, at, side="right") - 1
+        leave = at + shift[:-1]
+        moved = starts + shift[np.searchsorted(at, starts, side="left")]
+        rows = [(moved, self.runs["pass"], self.runs["kind"])]
+        rows.append(
+            (leave + 1, first + np.arange(len(at)), np.full(len(at), kind)))
+        rows.append((leave + added, self.runs["pass"][owner],
+                     self.runs["kind"][owner]))
+        runs = np.empty(sum(len(r[0]) for r in rows), dtype=RUN)
+        for n, name in enumerate(RUN.names):
+            runs[name] = np.concatenate([row[n] for row in rows])
+        # A detour with no points ties with its return and is dropped
+        runs = runs[np.argsort(runs["start"], kind="stable")]
+        self._size += int(added.sum())
+        self.runs = _merge_runs(runs, self._size)
+        self._xy = splice(self.xy, [(r, np.asarray(points, dtype=float))
+                                    for r, (_, points) in zip(at, detours)])
+
+    def close(self):
+        """Returns the route to its first point"""
+        if self._size:
+            self.append(self.xy[:1], self.runs["kind"][0],
+                        self.runs["pass"][0])
+
+    def buffer(self):
+        """The [x, y] points as a buffer, for writers which take bytes"""
+        return memoryview(self.xy)
+
+    def to_latlon(self):
+        """Converts the route back to GPS
+
+        Returns:
+            The [lat, long] of each point
+        """
+        lat, lon = utm.to_latlon(self.xy[:, 0], self.xy[:, 1],
+                                 self.zone_number, self.zone_letter)
+        return np.stack((lat, lon), axis=1)
+
+    def save(self, fname):
+        """Saves the points, runs and zone to an .npz file"""
+        np.savez(fname,
+                 xy=self.xy,
+                 runs=self.runs,
+                 zone_number=self.zone_number or 0,
+                 zone_letter=self.zone_letter or "")
+
+    @classmethod
+    def load(cls, fname):
+        """Loads a plan saved by save()"""
+        with np.load(fname) as f:
+            return cls(f["xy"], f["runs"],
+                       int(f["zone_number"]) or None,
+                       str(f["zone_letter"]) or None)
+
+
+def _merge_runs(runs, size):
+    """Drops empty runs and joins neighbours of the same pass and kind"""
+    ends = np.append(runs["start"][1:], size)
+    runs = runs[ends > runs["start"]]
+    same = (runs["pass"][1:] == runs["pass"][:-1]) & \
+        (runs["kind"][1:] == runs["kind"][:-1])
+    return runs[np.concatenate(([True], ~same))]
@@ -0,0 +1,104 @@
+"""
+
+Fast, headless plotting of large routes.
+
+The route is drawn as a single LineCollection, decimated to the
+resolution of the image, and the coverage is shown as the raster used
+to measure it rather than buffered polygons. The cost is therefore
+fixed by the size of the image, not the length of the route.
+
+"""
+
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.collections import LineCollection
+from matplotlib.figure import Figure
+
+from raster import coverage_raster, coverage_ratio, make_grid, polygon_mask
+
+
+def decimate(route, res):
+    """Drops consecutive points that fall within the same pixel
+
+    Args:
+        route: The [x, y] points of the route
+        res: The size of a pixel in metres
+
+    Returns:
+        The decimated route
+    """
+    route = np.asarray(route, dtype=float)
+    if len(route) < 3:
+        return route
+    pix = np.floor((route - route.min(axis=0)) / res).astype(np.int64)
+    keep = np.ones(len(route), dtype=bool)
+    keep[1:] = (np.diff(pix, axis=0) != 0).any(axis=1)
+    keep[-1] = True
+    return route[keep]
+
+
+def render(fname,
+           route,
+           width,
+           perimeter,
+           inner=None,
+           nogos=(),
+           size=(8, 8),
+           dpi=150):
+    """Draws a route and its coverage to a PNG
+
+    Args:
+        fname: Where to save the image
+        route: The [x, y] points of the route
+        width: The width of the blades in metres
+        perimeter: The original perimeter
+        inner: The inner perimeter
+        nogos: The original nogo zones
+        size: The size of the image in inches
+        dpi: The resolution of the image
+
+    Returns:
+        The share of the perimeter, outside the nogo zones, covered
+    """
+    route = np.asarray(route, dtype=float)
+    bounds = np.concatenate((perimeter.min(axis=0), perimeter.max(axis=0)))
+    res = max(bounds[2] - bounds[0], bounds[3] - bounds[1]) / (max(size) * dpi)
+    grid = make_grid(bounds, res)
+    mask = polygon_mask(grid, perimeter, nogos)
+    covered = coverage_raster(grid, route, width, partial=True)
+
+    fig = Figure(figsize=size, dpi=dpi)
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot(111)
+    ax.set_axis_off()
+    ax.set_aspect("equal")
+
+    # Mowable area in grey, covered area in blue, and covered pixels
+    # outside the mowable area in red
+    image = np.zeros(grid[2] + (4, ))
+    image[mask] = [0.8, 0.8, 0.8, 1]
+    image[covered & mask] = [0.3, 0.5, 0.9, 1]
+    image[covered & ~mask] = [0.9, 0.3, 0.3, 1]
+    ax.imshow(image,
+              origin="lower",
+              extent=(bounds[0], bounds[0] + grid[2][1] * res, bounds[1],
+                      bounds[1] + grid[2][0] * res),
+              interpolation="nearest")
+
+    points = decimate(route, res)
+    segments = np.stack((points[:-1], points[1:]), axis=1)
+    ax.add_collection(LineCollection(segments, linewidths=0.3, colors="red"))
+    outlines = [perimeter] + list(nogos)
+    if inner is not None:
+        outlines.append(inner)
+    ax.add_collection(LineCollection(outlines, linewidths=1, colors="black"))
+    if len(route) > 0:
+        ax.scatter(route[0, 0], route[0, 1], color="blue")
+    ax.set_xlim(bounds[0], bounds[2])
+    ax.set_ylim(bounds[1], bounds[3])
+
+    fig.savefig(fname)
+    ratio = coverage_ratio(covered, mask)
+    print("Saved " + fname + " with " + str(round(ratio * 100, 1)) +
+          "% coverage")
+    return ratio
@@ -0,0 +1,221 @@
+"""
+
+Rasterises areas and the coverage of a route onto a grid.
+
+The same rasters are used to measure coverage and to draw it, so the
+cost depends on the size of the grid rather than the length of the
+route.
+
+"""
+
+import math
+
+import numpy as np
+from matplotlib.path import Path
+from scipy import ndimage
+from scipy.spatial import cKDTree
+
+# Rough peak bytes per pixel while rasterising, counting the pixel
+# centres and the nearest segment of the route to each
+BYTES_PER_PIXEL = 160
+
+
+def make_grid(bounds, res):
+    """Describes a grid of square pixels covering a bounding box
+
+    Args:
+        bounds: The [min_x, min_y, max_x, max_y] to cover
+        res: The size of a pixel in metres
+
+    Returns:
+        The [x, y] of the first pixel's corner, the pixel size, and the
+        grid's (rows, cols)
+    """
+    origin = np.asarray(bounds[:2], dtype=float)
+    cols = max(1, math.ceil((bounds[2] - bounds[0]) / res))
+    rows = max(1, math.ceil((bounds[3] - bounds[1]) / res))
+    return origin, res, (rows, cols)
+
+
+def tile_grids(bounds, res, memory_budget):
+    """Splits the grid over a bounding box into tiles which fit in memory
+
+    Args:
+        bounds: The [min_x, min_y, max_x, max_y] to cover
+        res: The size of a pixel in metres
+        memory_budget: The bytes available for rasterising one tile
+
+    Returns:
+        A grid, as from make_grid, for each tile, together covering the
+        pixels of the grid over the whole box
+    """
+    origin, res, (rows, cols) = make_grid(bounds, res)
+    side = max(1, int(math.sqrt(memory_budget / BYTES_PER_PIXEL)))
+    grids = []
+    for r in range(0, rows, side):
+        for c in range(0, cols, side):
+            grids.append(
+                (origin + [c * res, r * res], res, (min(side, rows - r),
+                                                    min(side, cols - c))))
+    return grids
+
+
+def pixel_centres(grid):
+    """The [x, y] centre of every pixel of a grid, row by row"""
+    origin, res, (rows, cols) = grid
+    xs = origin[0] + (np.arange(cols) + 0.5) * res
+    ys = origin[1] + (np.arange(rows) + 0.5) * res
+    return np.stack(np.meshgrid(xs, ys), axis=-1).reshape(-1, 2)
+
+
+def polygon_mask(grid, shape, nogos=()):
+    """Marks the pixels inside a shape and outside every nogo zone
+
+    Args:
+        grid: The grid from make_grid
+        shape: The [x, y] perimeter
+        nogos: A list of [x, y] nogo zones
+
+    Returns:
+        A boolean (rows, cols) mask
+    """
+    centres = pixel_centres(grid)
+    inside = Path(shape).contains_points(centres)
+    for nogo in nogos:
+        inside &= ~Path(nogo).contains_points(centres)
+    return inside.reshape(grid[2])
+
+
+def sample_route(route, step):
+    """Samples points along every segment of a route
+
+    Args:
+        route: The [x, y] points of the route
+        step: The largest distance between samples
+
+    Returns:
+        The sampled [x, y] points
+    """
+    route = np.asarray(route, dtype=float)
+    if len(route) < 2:
+        return route
+    seg = np.diff(route, axis=0)
+    count = np.maximum(
+        np.ceil(np.linalg.norm(seg, axis=1) / step).astype(np.int64), 1)
+    idx = np.repeat(np.arange(len(seg)), count)
+    start = np.repeat(np.cumsum(count) - count, count)
+    frac = (np.arange(len(idx)) - start) / count[idx]
+    return np.concatenate((route[idx] + frac[:, None] * seg[idx], route[-1:]))
+
+
+def sample_segments(a, b, step):
+    """Samples points along separate segments, including both ends
+
+    Args:
+        a: The [x, y] start of each segment
+        b: The [x, y] end of each segment
+        step: The largest distance between samples
+
+    Returns:
+        The sampled [x, y] points and the segment each lies on
+    """
+    seg = b - a
+    count = np.maximum(
+        np.ceil(np.linalg.norm(seg, axis=1) / step).astype(np.int64), 1) + 1
+    idx = np.repeat(np.arange(len(seg)), count)
+    start = np.repeat(np.cumsum(count) - count, count)
+    frac = (np.arange(len(idx)) - start) / (count[idx] - 1)
+    return a[idx] + frac[:, None] * seg[idx], idx
+
+
+def segment_distance(points, a, b):
+    """The distance from each point to the segment paired with it
+
+    Args:
+        points: The [..., 2] points
+        a: The [..., 2] start of each segment
+        b: The [..., 2] end of each segment
+
+    Returns:
+        The distances
+    """
+    d = b - a
+    length = (d**2).sum(axis=-1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        t = np.clip(((points - a) * d).sum(axis=-1) / length, 0, 1)
+    t = np.nan_to_num(t)
+    return np.linalg.norm(points - a - t[..., None] * d, axis=-1)
+
+
+def coverage_raster(grid, route, width, partial=False):
+    """Rasterises the area covered by the blades along a route
+
+    By default a pixel is only covered if all of it is within reach of
+    the blades, so a gap is never hidden by the size of the pixels.
+
+    Args:
+        grid: The grid from make_grid
+        route: The [x, y] points of the route
+        width: The width of the blades in metres
+        partial: Count a pixel as covered if any of it is within reach,
+            for drawing
+
+    Returns:
+        A boolean (rows, cols) mask of the covered pixels
+    """
+    origin, res, shape = grid
+    route = np.asarray(route, dtype=float).reshape(-1, 2)
+    a = route[:-1] if len(route) > 1 else route
+    b = route[1:] if len(route) > 1 else route
+    # Only the segments within reach of the grid matter
+    reach = width / 2 + 2 * res
+    top = origin + [shape[1] * res, shape[0] * res]
+    near = ((np.maximum(a, b) >= origin - reach).all(axis=1) &
+            (np.minimum(a, b) <= top + reach).all(axis=1))
+    a = a[near]
+    b = b[near]
+    if len(a) == 0:
+        return np.zeros(shape, dtype=bool)
+    samples, seg = sample_segments(a, b, res / 2)
+
+    if partial:
+        # Pad the grid so the blades passing just outside it are seen
+        pad = math.ceil(reach / res)
+        idx = np.floor((samples - origin) / res).astype(np.int64) + pad
+        padded = (shape[0] + 2 * pad, shape[1] + 2 * pad)
+        keep = ((idx >= 0) & (idx < [padded[1], padded[0]])).all(axis=1)
+        hit = np.zeros(padded, dtype=bool)
+        hit[idx[keep, 1], idx[keep, 0]] = True
+        # Distances are between pixel centres
+        covered = (ndimage.distance_transform_edt(~hit) * res
+                   <= width / 2 + res / 2)
+        return covered[pad:pad + shape[0], pad:pad + shape[1]]
+
+    # The segment nearest each pixel centre, found from the samples, must
+    # reach every corner of the pixel
+    centres = pixel_centres(grid)
+    _, nearest = cKDTree(samples).query(centres,
+                                        distance_upper_bound=reach,
+                                        workers=-1)
+    found = np.flatnonzero(nearest < len(samples))
+    s = seg[nearest[found]]
+    covered = np.zeros(len(centres), dtype=bool)
+    covered[found] = True
+    for corner in ([-0.5, -0.5], [-0.5, 0.5], [0.5, -0.5], [0.5, 0.5]):
+        point = centres[found] + np.multiply(corner, res)
+        covered[found] &= segment_distance(point, a[s], b[s]) <= width / 2
+    return covered.reshape(shape)
+
+
+def coverage_ratio(covered, mask):
+    """The share of a mask which is covered
+
+    Args:
+        covered: The mask from coverage_raster
+        mask: The mask from polygon_mask
+
+    Returns:
+        The covered share of the mask, from 0 to 1
+    """
+    total = mask.sum()
+    return float((covered & mask).sum() / total) if total else 1.0
@@ -0,0 +1,216 @@
+"""
+
+Repairs gaps in the coverage of a planned route.
+
+Rather than raising the overlap across the whole lawn, the blade
+footprint of the route is rasterised to find the patches it actually
+misses. A short route is planned over each patch and spliced into the
+main route at its nearest point with a clear way to it.
+
+"""
+
+import numpy as np
+from matplotlib.path import Path
+from scipy import ndimage
+from scipy.spatial import cKDTree
+
+from plan import splice
+from raster import coverage_raster, pixel_centres, polygon_mask, tile_grids
+from strips import (CANDIDATES, boundary_tree, crossing, plan_strips,
+                    route_join)
+
+
+def find_gaps(route,
+              width,
+              shape,
+              nogos=(),
+              res=0.05,
+              min_area=None,
+              memory_budget=256 * 1024**2):
+    """Finds the patches of an area the route does not cover
+
+    The area is rasterised a tile at a time, so a patch crossing the edge
+    of a tile is found as one patch on each side.
+
+    Args:
+        route: The [x, y] points of the route
+        width: The width of the blades in metres
+        shape: The area that should be covered, usually the inner
+            perimeter
+        nogos: The nogo zones to leave out, usually the outer nogos
+        res: The size of a raster pixel in metres
+        min_area: Patches smaller than this, in square metres, are
+            ignored. Defaults to a tenth of the blade's footprint
+        memory_budget: The bytes available for rasterising one tile
+
+    Returns:
+        A list of the [x, y] pixel centres of each patch, and the share of
+        the area covered
+    """
+    if min_area is None:
+        min_area = width * width / 10
+    route = np.asarray(route, dtype=float)
+    bounds = np.concatenate((shape.min(axis=0), shape.max(axis=0)))
+    patches = []
+    area = 0
+    mown = 0
+    for grid in tile_grids(bounds, res, memory_budget):
+        mask = polygon_mask(grid, shape, nogos)
+        if not mask.any():
+            continue
+        covered = coverage_raster(grid, route, width)
+        area += int(mask.sum())
+        mown += int((covered & mask).sum())
+
+        labels, count = ndimage.label(mask & ~covered)
+        sizes = np.bincount(labels.ravel(), minlength=count + 1)
+        centres = pixel_centres(grid)
+        flat = labels.ravel()
+        keep = np.flatnonzero(sizes[1:] * res * res >= min_area) + 1
+        # Group the pixels of every patch at once
+        order = np.argsort(flat, kind="stable")
+        edges = np.searchsorted(flat[order], np.arange(count + 2))
+        patches.extend(centres[order[edges[k]:edges[k + 1]]] for k in keep)
+    return patches, mown / area if area else 1.0
+
+
+def patch_route(patch, height, width, overlap, shape, nogos=()):
+    """Plans a short route over one patch
+
+    The patch's pixels are grouped into cells of the usual lattice
+    spacing and the strips of the cells' centres are planned. A centre
+    which falls outside the mowable area is moved to the patch pixel
+    nearest it.
+
+    Args:
+        patch: The [x, y] pixel centres of the patch
+        height: The height of the robot
+        width: The width of the robot
+        overlap: The overlap used in Quantise
+        shape: The area that should be covered, usually the inner
+            perimeter
+        nogos: The nogo zones to leave out, usually the outer nogos
+
+    Returns:
+        The [x, y] points of the patch route
+    """
+    step = np.array([width * overlap, height])
+    low = patch.min(axis=0)
+    cells = np.unique(np.floor((patch - low) / step), axis=0)
+    # Keep points within patches narrower than a cell
+    points = np.minimum(low + (cells + 0.5) * step, patch.max(axis=0))
+    outside = ~Path(shape).contains_points(points)
+    for nogo in nogos:
+        outside |= Path(nogo).contains_points(points)
+    if outside.any():
+        _, nearest = cKDTree(patch).query(points[outside])
+        points[outside] = patch[nearest]
+        points = np.unique(points, axis=0)
+    if len(points) == 1:
+        return points
+    return plan_strips(points,
+                       height,
+                       width,
+                       overlap,
+                       boundaries=[shape] + list(nogos))
+
+
+def find_detours(route,
+                 height,
+                 width,
+                 overlap,
+                 shape,
+                 nogos=(),
+                 res=0.05,
+                 memory_budget=256 * 1024**2):
+    """Plans short detours to cover the patches a route misses
+
+    Each detour leaves the route at its point nearest the patch whose
+    legs to and from the patch cross no boundary, covers the patch, and
+    returns to the same point. If every leg nearby is blocked the legs
+    follow the boundaries they cross.
+
+    Args:
+        route: The [x, y] points of the route
+        height: The height of the robot
+        width: The width of the robot
+        overlap: The overlap used in Quantise
+        shape: The area that should be covered, usually the inner
+            perimeter
+        nogos: The nogo zones to leave out, usually the outer nogos
+        res: The size of a raster pixel in metres
+        memory_budget: The bytes available for rasterising one tile
+
+    Returns:
+        A list of (index, points) detours, sorted by the index of the
+        route point each leaves from, and the share of the area the
+        route covers
+    """
+    route = np.asarray(route, dtype=float)
+    patches, coverage = find_gaps(route,
+                                  width,
+                                  shape,
+                                  nogos,
+                                  res,
+                                  memory_budget=memory_budget)
+    if len(patches) == 0:
+        return [], coverage
+
+    tree = cKDTree(route)
+    rings = [np.asarray(ring, dtype=float) for ring in [shape] + list(nogos)]
+    area_tree, areas = boundary_tree(rings)
+    k = min(CANDIDATES, len(route))
+    detours = []
+    for patch in patches:
+        detour = patch_route(patch, height, width, overlap, shape, nogos)
+        # Enter the patch from either end, nearest the route first
+        dist, idx = tree.query(detour[[0, -1]], k=k)
+        dist = dist.reshape(2, -1)
+        idx = idx.reshape(2, -1)
+        end, c = np.unravel_index(np.argsort(dist, axis=None, kind="stable"),
+                                  dist.shape)
+        r = idx[end, c]
+        enter = detour[[0, -1]][end]
+        leave = detour[[-1, 0]][end]
+        blocked = ((crossing(area_tree, areas, route[r], enter) >= 0) |
+                   (crossing(area_tree, areas, route[r], leave) >= 0))
+        clear = np.flatnonzero(~blocked)
+        best = clear[0] if len(clear) > 0 else 0
+        if end[best] == 1:
+            detour = detour[::-1]
+        start = route[r[best]]
+        if len(clear) == 0:
+            detour = np.concatenate(
+                (route_join(start, detour[0], rings, area_tree, areas), detour,
+                 route_join(detour[-1], start, rings, area_tree, areas)))
+        detours.append((int(r[best]), detour))
+    detours.sort(key=lambda d: d[0])
+    return detours, coverage
+
+
+def repair(route, height, width, overlap, shape, nogos=(), res=0.05):
+    """Adds short detours to a route to cover the patches it misses
+
+    Args:
+        route: The [x, y] points of the route
+        height: The height of the robot
+        width: The width of the robot
+        overlap: The overlap used in Quantise
+        shape: The area that should be covered, usually the inner
+            perimeter
+        nogos: The nogo zones to leave out, usually the outer nogos
+        res: The size of a raster pixel in metres
+
+    Returns:
+        The repaired route
+    """
+    route = np.asarray(route, dtype=float)
+    detours, before = find_detours(route, height, width, overlap, shape, nogos,
+                                   res)
+    new = splice(route, detours)
+    _, after = find_gaps(new, width, shape, nogos, res)
+    print("Repaired " + str(len(detours)) + " gaps with " +
+          str(len(new) - len(route)) + " points, coverage " +
+          str(round(before * 100, 1)) + "% to " + str(round(after * 100, 1)) +
+          "%")
+    return new
@@ -0,0 +1,235 @@
+"""
+
+Simulates the fixes a robot would report while driving a route.
+
+The robot accelerates and brakes along each straight run of the
+route, stops at every turn to rotate on the spot, and reports its
+position at a fixed rate with RTK-like errors added. Every fix is
+computed at once from the speed profile of each run, so millions of
+time-stamped fixes can be produced for load testing the matching and
+off-course detection.
+
+"""
+
+import math
+from collections import namedtuple
+
+import numpy as np
+from scipy.signal import lfilter
+
+from optimise import TimeModel, turn_angles, turn_time
+
+# NMEA GGA fix qualities
+RTK_FIXED = 4
+RTK_FLOAT = 5
+
+FIX = np.dtype([("t", "<f8"), ("x", "<f8"), ("y", "<f8"), ("quality", "u1")])
+
+ErrorModel = namedtuple("ErrorModel", [
+    "kind", "sigma", "float_sigma", "float_share", "float_time", "bias_sigma",
+    "bias_time"
+],
+                        defaults=["rtk", 0.02, 0.3, 0.05, 10.0, 0.01, 60.0])
+ErrorModel.__doc__ = """Parameters of the position error added to each fix
+
+Args:
+    kind: "none", "uniform" for the noise of the generated test routes,
+        "gaussian", or "rtk"
+    sigma: The standard deviation in metres, or the largest error for
+        "uniform"
+    float_sigma: The standard deviation in metres without an RTK fix
+    float_share: The share of the time spent without an RTK fix
+    float_time: The mean length in seconds of a spell without a fix
+    bias_sigma: The standard deviation in metres of the slowly wandering
+        bias of the corrections
+    bias_time: The time in seconds over which the bias wanders
+"""
+
+
+def distance_along(route):
+    """The distance along a route to each of its points"""
+    seg = np.linalg.norm(np.diff(route, axis=0), axis=1)
+    return np.concatenate(([0], np.cumsum(seg)))
+
+
+def speed_profile(route, model=TimeModel(), accel=0.5):
+    """Splits a route into straight runs between stops
+
+    The robot stops at each turn larger than the model's minimum turn
+    and rotates on the spot for the model's turn time.
+
+    Args:
+        route: The [x, y] points of the route
+        model: The time model to use
+        accel: The acceleration and braking in m/s^2
+
+    Returns:
+        The distance along the route to the start of each run, its
+        length, the time it starts moving, its duration, the time spent
+        accelerating, and the top speed reached
+    """
+    dist = distance_along(route)
+    angles = turn_angles(route)
+    stops = np.flatnonzero(angles > model.min_turn)
+    ends = np.concatenate(([0], stops, [len(route) - 1]))
+    start = dist[ends[:-1]]
+    length = dist[ends[1:]] - start
+
+    # A trapezoid, or a triangle if the run is too short to reach speed
+    t_acc = np.minimum(model.speed / accel, np.sqrt(length / accel))
+    top = accel * t_acc
+    with np.errstate(invalid="ignore", divide="ignore"):
+        cruise = np.where(top > 0, (length - accel * t_acc**2) / top, 0.0)
+    duration = 2 * t_acc + cruise
+
+    dwell = turn_time(angles[ends[:-1]], model)
+    begin = np.cumsum(dwell) + np.concatenate(([0], np.cumsum(duration[:-1])))
+    return start, length, begin, duration, t_acc, top
+
+
+def trajectory(route, rate, model=TimeModel(), accel=0.5):
+    """Samples the true position of the robot at a fixed rate
+
+    Args:
+        route: The [x, y] points of the route
+        rate: The number of fixes per second
+        model: The time model to use
+        accel: The acceleration and braking in m/s^2
+
+    Returns:
+        The time of each fix and the [x, y] position at that time
+    """
+    route = np.asarray(route, dtype=float)
+    # Repeated points would hide the turn made at them
+    keep = np.concatenate(([True], (np.diff(route, axis=0) != 0).any(axis=1)))
+    route = route[keep]
+    if len(route) < 2:
+        return np.zeros(len(route)), route
+
+    start, length, begin, duration, t_acc, top = speed_profile(
+        route, model, accel)
+    t = np.arange(0, begin[-1] + duration[-1], 1 / rate)
+
+    # Before a run starts moving the robot is turning at the end of the
+    # run before it
+    run = np.maximum(np.searchsorted(begin, t, side="right") - 1, 0)
+    tau = np.clip(t - begin[run], 0, duration[run])
+    a = accel
+    ta = t_acc[run]
+    end = duration[run] - tau
+    s = np.where(
+        tau < ta, 0.5 * a * tau**2,
+        np.where(end < ta, length[run] - 0.5 * a * end**2,
+                 0.5 * a * ta**2 + top[run] * (tau - ta)))
+    s = np.clip(s, 0, length[run]) + start[run]
+
+    dist = distance_along(route)
+    xy = np.column_stack(
+        (np.interp(s, dist, route[:, 0]), np.interp(s, dist, route[:, 1])))
+    return t, xy
+
+
+def _float_spells(t, model, rng):
+    """Marks the fixes taken without an RTK fix
+
+    Spells with and without a fix alternate, each lasting an
+    exponentially distributed time.
+    """
+    if model.float_share <= 0:
+        return np.zeros(len(t), dtype=bool)
+    fixed_time = model.float_time * (1 - model.float_share) / model.float_share
+    means = np.array([fixed_time, model.float_time])
+    count = 2 * math.ceil(t[-1] / means.sum()) + 2
+    spells = rng.exponential(np.resize(means, count))
+    while spells.sum() <= t[-1]:
+        spells = np.concatenate((spells, rng.exponential(means)))
+    return np.searchsorted(np.cumsum(spells), t, side="right") % 2 == 1
+
+
+def add_error(t, xy, model=ErrorModel(), rng=None):
+    """Adds position errors to the true positions
+
+    The "rtk" errors have a small white noise while fixed, a larger one
+    during spells without a fix, and a bias which wanders slowly as a
+    first order Gauss-Markov process.
+
+    Args:
+        t: The time of each fix
+        xy: The true [x, y] positions
+        model: The error model
+        rng: A NumPy random generator
+
+    Returns:
+        The noisy [x, y] positions and the quality of each fix
+    """
+    rng = rng or np.random.default_rng()
+    n = len(xy)
+    quality = np.full(n, RTK_FIXED, dtype=np.uint8)
+    if model.kind == "none" or n == 0:
+        return xy.copy(), quality
+    if model.kind == "uniform":
+        return xy + rng.uniform(-model.sigma, model.sigma, (n, 2)), quality
+    if model.kind == "gaussian":
+        return xy + rng.normal(0, model.sigma, (n, 2)), quality
+    if model.kind != "rtk":
+        raise ValueError("Unknown error model " + model.kind)
+
+    floating = _float_spells(t, model, rng)
+    quality[floating] = RTK_FLOAT
+    sigma = np.where(floating, model.float_sigma, model.sigma)
+    noise = rng.normal(0, 1, (n, 2)) * sigma[:, None]
+
+    dt = t[1] - t[0] if n > 1 else 1.0
+    phi = math.exp(-dt / model.bias_time)
+    kick = rng.normal(0, model.bias_sigma * math.sqrt(1 - phi**2), (n, 2))
+    first = rng.normal(0, model.bias_sigma, (1, 2))
+    bias, _ = lfilter([1], [1, -phi], kick, axis=0, zi=phi * first)
+    return xy + noise + bias, quality
+
+
+def simulate(route,
+             rate=10,
+             model=TimeModel(),
+             accel=0.5,
+             error=ErrorModel(),
+             start_time=0.0,
+             seed=None):
+    """Simulates the fixes reported while driving a route
+
+    Args:
+        route: The [x, y] points of the route
+        rate: The number of fixes per second
+        model: The time model for the speed and turns
+        accel: The acceleration and braking in m/s^2
+        error: The error model
+        start_time: The time of the first fix in seconds
+        seed: The random seed
+
+    Returns:
+        A FIX array of the time, position, and quality of every fix
+    """
+    t, xy = trajectory(route, rate, model, accel)
+    noisy, quality = add_error(t, xy, error, np.random.default_rng(seed))
+    fixes = np.empty(len(t), dtype=FIX)
+    fixes["t"] = t + start_time
+    fixes["x"] = noisy[:, 0]
+    fixes["y"] = noisy[:, 1]
+    fixes["quality"] = quality
+    return fixes
+
+
+def write_fixes(fname, fixes, binary=True):
+    """Writes fixes as raw FIX records, or as CSV rows of t, x, y, quality"""
+    if binary:
+        fixes.tofile(fname)
+    else:
+        np.savetxt(fname,
+                   np.column_stack(
+                       (fixes["t"], fixes["x"], fixes["y"], fixes["quality"])),
+                   fmt=["%.3f", "%.4f", "%.4f", "%d"],
+                   delimiter=",")
+
+
+def read_fixes(fname):
+    """Memory maps fixes written by write_fixes() as raw records"""
+    return np.memmap(fname, dtype=FIX, mode="r")
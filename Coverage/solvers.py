@@ -0,0 +1,185 @@
+"""
+
+A portfolio of TSP solvers run against a shared deadline.
+
+NetworkX provides several TSP approximations with very different
+costs. Each is run in its own process and the best tour found by the
+deadline wins. The time and quality of every method is recorded so
+the methods worth running can be learnt from the size of the problem.
+
+"""
+
+import json
+import math
+import multiprocessing
+import os
+import queue
+import time
+
+import networkx as nx
+
+METHODS = [
+    "christofides", "greedy", "simulated_annealing", "threshold_accepting"
+]
+
+
+def _method(name):
+    """The NetworkX TSP method for a name"""
+    approx = nx.approximation
+    if name == "christofides":
+        return approx.christofides
+    if name == "greedy":
+        return approx.greedy_tsp
+    if name == "simulated_annealing":
+        return lambda g, weight: approx.simulated_annealing_tsp(
+            g, "greedy", weight=weight)
+    if name == "threshold_accepting":
+        return lambda g, weight: approx.threshold_accepting_tsp(
+            g, "greedy", weight=weight)
+    raise ValueError("Unknown TSP method " + name)
+
+
+def _run(graph, name, results):
+    """Solves the TSP with one method and puts the result on a queue
+
+    A failed method puts None in place of its tour and cost.
+    """
+    start = time.perf_counter()
+    try:
+        tour = nx.approximation.traveling_salesman_problem(
+            graph, cycle=True, method=_method(name))
+        cost = nx.path_weight(graph, tour, "weight")
+    except Exception as e:
+        print(name + " failed: " + str(e))
+        tour = cost = None
+    results.put((name, tour, cost, time.perf_counter() - start))
+
+
+def size_bucket(n):
+    """Groups problem sizes by powers of two"""
+    return int(math.log2(max(n, 1)))
+
+
+def load_stats(stats_file):
+    """Loads the recorded solver results, if any"""
+    if stats_file is None or not os.path.exists(stats_file):
+        return []
+    with open(stats_file) as f:
+        return json.load(f)
+
+
+def suggest(n, stats_file, count=2):
+    """Picks the methods to run for a problem size from past results
+
+    Each method is scored by how close its tours were to the best tour
+    of the same run, and how often it finished, for problems of a
+    similar size.
+
+    Args:
+        n: The number of nodes in the graph
+        stats_file: The file of recorded results
+        count: The number of methods to pick
+
+    Returns:
+        The methods to run, best first, or every method if there are no
+        results for this size
+    """
+    bucket = size_bucket(n)
+    runs = {}
+    for record in load_stats(stats_file):
+        if record["bucket"] == bucket:
+            runs.setdefault(record["run"], []).append(record)
+    if not runs:
+        return list(METHODS)
+
+    scores = {name: [] for name in METHODS}
+    for records in runs.values():
+        finished = [r["cost"] for r in records if r["cost"] is not None]
+        best = min(finished) if finished else None
+        for r in records:
+            if r["cost"] is None or not best:
+                scores[r["method"]].append(0.0)
+            else:
+                scores[r["method"]].append(best / r["cost"])
+    ranked = sorted(METHODS,
+                    key=lambda m: -sum(scores[m]) / max(len(scores[m]), 1))
+    return ranked[:count]
+
+
+def record_stats(stats_file, n, results, methods):
+    """Appends the results of a run to the stats file"""
+    if stats_file is None:
+        return
+    stats = load_stats(stats_file)
+    run = max([r["run"] for r in stats], default=-1) + 1
+    for name in methods:
+        cost, seconds = results.get(name, (None, None))
+        stats.append({
+            "run": run,
+            "nodes": n,
+            "bucket": size_bucket(n),
+            "method": name,
+            "cost": cost,
+            "seconds": seconds
+        })
+    with open(stats_file, "w") as f:
+        json.dump(stats, f, indent=1)
+
+
+def solve(graph, deadline=60, methods=None, stats_file=None):
+    """Solves the TSP with several methods at once, keeping the best
+
+    Every method runs in its own process. When the deadline is reached
+    the unfinished methods are stopped and the best tour found so far
+    is returned. If none have finished, the first to finish is used.
+
+    Args:
+        graph: The graph from graph()
+        deadline: The time allowed in seconds
+        methods: The methods to run, defaults to those suggested by the
+            stats file, or all of them
+        stats_file: A JSON file to learn from and record results in
+
+    Returns:
+        The best tour found, as a list of nodes
+    """
+    n = graph.number_of_nodes()
+    if methods is None:
+        methods = suggest(n, stats_file)
+    results = multiprocessing.Queue()
+    procs = {}
+    for name in methods:
+        procs[name] = multiprocessing.Process(target=_run,
+                                              args=(graph, name, results),
+                                              daemon=True)
+        procs[name].start()
+
+    end = time.monotonic() + deadline
+    found = {}
+    best = None
+    while len(found) < len(procs):
+        remaining = end - time.monotonic()
+        if remaining <= 0 and best is not None:
+            break
+        try:
+            name, tour, cost, seconds = results.get(
+                timeout=remaining if remaining > 0 else None)
+        except queue.Empty:
+            continue
+        found[name] = (cost, seconds)
+        if tour is None:
+            continue
+        print(name + " found a tour of " + str(round(cost, 1)) + " in " +
+              str(round(seconds, 1)) + " seconds")
+        if best is None or cost < best[1]:
+            best = (tour, cost)
+
+    for proc in procs.values():
+        if proc.is_alive():
+            proc.terminate()
+        proc.join()
+
+    record_stats(stats_file, n, found, methods)
+    if best is None:
+        raise RuntimeError("No TSP method found a tour")
+    return best[0]
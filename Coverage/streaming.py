@@ -0,0 +1,119 @@
+"""
+
+Emits the route band by band so the robot can start mowing early.
+
+Rather than planning the whole lawn before sending anything, the lawn
+is split into bands of rows. Each band is quantised and planned on its
+own and yielded as soon as it is ready, starting from the end of the
+band before it. The time to the first segment depends on the size of
+a band, not the size of the lawn.
+
+"""
+
+import math
+
+import numpy as np
+
+from strips import plan_strips
+from tiling import tile_lattice
+
+
+def band_boxes(shape, height, width, overlap, band_rows, axis=0):
+    """Splits the bounding box of a shape into bands of lattice rows
+
+    Args:
+        shape: The inner perimeter
+        height: The height of the robot
+        width: The width of the robot
+        overlap: The overlap used in Quantise
+        band_rows: The number of lattice rows (or columns) in a band
+        axis: 0 for bands of rows, 1 for bands of columns
+
+    Returns:
+        A list of [min_x, min_y, max_x, max_y] bands, in order
+    """
+    min_xy = shape.min(axis=0)
+    max_xy = shape.max(axis=0)
+    across = 1 - axis
+    step = [width * overlap, height][across] * band_rows
+    count = max(1, math.ceil((max_xy[across] - min_xy[across]) / step))
+    boxes = []
+    for n in range(count):
+        lo = min_xy.copy()
+        hi = max_xy.copy()
+        lo[across] = min_xy[across] + n * step
+        hi[across] = min_xy[across] + (n + 1) * step
+        boxes.append(np.concatenate((lo, hi)))
+    return boxes
+
+
+def first_band(shape, height, width, overlap, nogos, band_rows=20, axis=0):
+    """Finds the lattice points of the first band with any in it
+
+    Used to link the perimeter to the route without quantising the
+    whole lawn.
+
+    Args:
+        shape: The inner perimeter
+        height: The height of the robot
+        width: The width of the robot
+        overlap: The overlap used in Quantise
+        nogos: The outer nogo boundaries
+        band_rows: The number of lattice rows (or columns) in a band
+        axis: 0 for bands of rows, 1 for bands of columns
+
+    Returns:
+        The [x, y] lattice points of the band
+    """
+    origin = shape.min(axis=0) + [width / 2, height / 2]
+    for box in band_boxes(shape, height, width, overlap, band_rows, axis):
+        points = tile_lattice(shape, box, origin, height, width, overlap,
+                              nogos)
+        if len(points) > 0:
+            return points
+    return np.empty((0, 2))
+
+
+def stream_route(shape,
+                 height,
+                 width,
+                 overlap,
+                 nogos,
+                 band_rows=20,
+                 axis=0,
+                 start=None):
+    """Plans and yields the route one band at a time
+
+    Each chunk starts at the strip nearest the end of the chunk before
+    it, so joining the chunks end to end gives one continuous route,
+    with each join a short move between neighbouring bands.
+
+    Args:
+        shape: The inner perimeter
+        height: The height of the robot
+        width: The width of the robot
+        overlap: The overlap used in Quantise
+        nogos: The outer nogo boundaries
+        band_rows: The number of lattice rows (or columns) in a band
+        axis: 0 for left-right strips, 1 for up-down strips
+        start: The [x, y] position the route starts from
+
+    Yields:
+        The [x, y] points of each band's route
+    """
+    origin = shape.min(axis=0) + [width / 2, height / 2]
+    last = start
+    for box in band_boxes(shape, height, width, overlap, band_rows, axis):
+        points = tile_lattice(shape, box, origin, height, width, overlap,
+                              nogos)
+        if len(points) == 0:
+            continue
+        chunk = plan_strips(points,
+                            height,
+                            width,
+                            overlap,
+                            axis,
+                            start=last,
+                            boundaries=[shape] + list(nogos))
+        last = chunk[-1]
+        yield chunk
@@ -0,0 +1,344 @@
+"""
+
+Plans the coverage route over straight strips rather than individual
+lattice points.
+
+Each contiguous run of points from Quantise along a row (or column)
+becomes a single strip with two endpoints. The strips are ordered
+and oriented, then expanded back into points, greatly reducing the
+size of the problem compared to using every point as a graph node.
+
+"""
+
+import numpy as np
+import shapely
+
+from validate import intersect, ring_edges
+
+# Nearest endpoints checked at once for a clear join
+CANDIDATES = 16
+
+
+def lattice_index(points, height, width, overlap):
+    """Converts the points from Quantise into integer lattice indices
+
+    Args:
+        points: The points from Quantise, as a set or an array
+        height: The height of the robot
+        width: The width of the robot
+        overlap: The overlap used in Quantise
+
+    Returns:
+        The points as an array and their [column, row] indices
+    """
+    pts = np.array(list(points), dtype=float).reshape(-1, 2)
+    if len(pts) == 0:
+        return pts, np.empty((0, 2), dtype=np.int64)
+    step = np.array([width * overlap, height])
+    idx = np.rint((pts - pts.min(axis=0)) / step).astype(np.int64)
+    return pts, idx
+
+
+def find_strips(points, height, width, overlap, axis=0):
+    """Collapses contiguous runs of lattice points into strips
+
+    Args:
+        points: The points from Quantise
+        height: The height of the robot
+        width: The width of the robot
+        overlap: The overlap used in Quantise
+        axis: 0 for strips along rows (left-right), 1 for strips along
+            columns (up-down)
+
+    Returns:
+        The points sorted into strip order, and the start and end
+        (inclusive) index of each strip within them
+    """
+    pts, idx = lattice_index(points, height, width, overlap)
+    if len(pts) == 0:
+        empty = np.empty(0, dtype=np.int64)
+        return pts, empty, empty
+
+    along = idx[:, axis]
+    across = idx[:, 1 - axis]
+    order = np.lexsort((along, across))
+    pts = pts[order]
+    along = along[order]
+    across = across[order]
+
+    # A new strip starts where the row changes or a point is skipped
+    breaks = (np.diff(across) != 0) | (np.diff(along) != 1)
+    starts = np.concatenate(([0], np.flatnonzero(breaks) + 1))
+    ends = np.concatenate((starts[1:] - 1, [len(pts) - 1]))
+    return pts, starts, ends
+
+
+def boundary_tree(boundaries):
+    """Indexes the areas inside boundary rings for crossing()
+
+    Args:
+        boundaries: A list of closed [x, y] rings, the first being the
+            perimeter to keep inside and the rest nogo zones to keep out of
+
+    Returns:
+        An STRtree of the areas and the areas themselves
+    """
+    areas = np.array([
+        shapely.Polygon(np.asarray(ring, dtype=float)) for ring in boundaries
+    ])
+    shapely.prepare(areas)
+    return shapely.STRtree(areas), areas
+
+
+def _blocking(tree, areas, lines):
+    """Pairs each move with the boundaries it crosses
+
+    Args:
+        tree: An STRtree of the areas, from boundary_tree()
+        areas: The area inside each boundary ring
+        lines: The moves as shapely linestrings
+
+    Returns:
+        The index of each blocked move and of the boundary it crosses
+    """
+    move, area = tree.query(lines, predicate="intersects")
+    # The inside of the move meets the outside of the perimeter or the
+    # inside of a nogo zone
+    outside = area == 0
+    blocked = np.empty(len(move), dtype=bool)
+    blocked[outside] = shapely.relate_pattern(lines[move[outside]],
+                                              areas[area[outside]],
+                                              "**T******")
+    blocked[~outside] = shapely.relate_pattern(lines[move[~outside]],
+                                               areas[area[~outside]],
+                                               "T********")
+    return move[blocked], area[blocked]
+
+
+def crossing(tree, areas, current, targets):
+    """Finds the boundary, if any, crossed by moving to each target
+
+    A move may run along a boundary or start and end on one, but no part
+    of it may leave the perimeter or enter a nogo zone, so a chord
+    between two vertices of a ring is caught as well as a move through
+    an edge.
+
+    Args:
+        tree: An STRtree of the areas, from boundary_tree()
+        areas: The area inside each boundary ring
+        current: The [x, y] position, or positions, to move from
+        targets: The [x, y] positions to move to
+
+    Returns:
+        The index of a boundary crossed by each move, or -1 if it is clear
+    """
+    lines = shapely.linestrings(
+        np.stack((np.broadcast_to(current, targets.shape), targets), axis=1))
+    move, area = _blocking(tree, areas, lines)
+    crossed = np.full(len(targets), -1)
+    crossed[move] = area
+    return crossed
+
+
+def around(p, q, ring):
+    """Follows a boundary ring past the part of a move which crosses it
+
+    The move is left where it first meets the ring and rejoined where it
+    last leaves it, taking the shorter way around the ring between, so
+    the straight legs to and from the ring are parts of the move itself.
+
+    Args:
+        p: The [x, y] point to leave from
+        q: The [x, y] point to arrive at
+        ring: The closed ring to follow
+
+    Returns:
+        The [x, y] points to pass through between p and q, none if the
+        move does not meet the ring
+    """
+    p = np.asarray(p, dtype=float)
+    q = np.asarray(q, dtype=float)
+    edges, _ = ring_edges([ring])
+    ring = edges[:, 0]
+    move = np.broadcast_to(np.stack((p, q)), edges.shape)
+    # Moves which start or end on the ring meet it despite rounding
+    hit, where = intersect(move, edges, 1e-9)
+    hits = np.flatnonzero(hit)
+    if len(hits) == 0:
+        return np.empty((0, 2))
+    # How far along the move each meeting is
+    along = (where[hits] - p) @ (q - p)
+    i = hits[np.argmin(along)]
+    j = hits[np.argmax(along)]
+    n = len(edges)
+    # Edge i runs from vertex i to vertex i + 1
+    forward = ring[(i + 1 + np.arange((j - i) % n)) % n]
+    backward = ring[(i - np.arange((i - j) % n)) % n]
+    paths = [
+        np.concatenate(([where[i]], path, [where[j]]))
+        for path in (forward, backward)
+    ]
+    lengths = [
+        np.linalg.norm(np.diff(path, axis=0), axis=1).sum() for path in paths
+    ]
+    return paths[int(np.argmin(lengths))]
+
+
+def route_join(p, q, rings, tree, areas):
+    """Routes a move around every boundary ring it crosses
+
+    Args:
+        p: The [x, y] point to leave from
+        q: The [x, y] point to arrive at
+        rings: The closed boundary rings
+        tree: An STRtree of the areas inside the rings, from
+            boundary_tree()
+        areas: The area inside each ring
+
+    Returns:
+        The [x, y] points to pass through between p and q
+    """
+    line = shapely.linestrings(np.stack((p, q)))
+    _, crossed = _blocking(tree, areas, np.array([line]))
+    paths = [around(p, q, rings[r]) for r in np.unique(crossed)]
+    paths = [path for path in paths if len(path) > 0]
+    if len(paths) == 0:
+        return np.empty((0, 2))
+    # Pass the rings in the order the move reaches them
+    paths.sort(key=lambda path: np.linalg.norm(path[0] - p))
+    return np.concatenate(paths)
+
+
+def order_strips(pts, starts, ends, start=None, boundaries=()):
+    """Orders and orients strips with a nearest endpoint search
+
+    The nearest endpoint whose join does not cross a boundary is taken.
+    If every join is blocked the nearest is taken, and the join follows
+    the boundaries it crosses.
+
+    Args:
+        pts: The points sorted into strip order
+        starts: The index of the first point of each strip
+        ends: The index of the last point of each strip
+        start: The [x, y] position the route starts from, defaults to
+            the first point of the first strip
+        boundaries: The closed rings joins must not cross
+
+    Returns:
+        The order of the strips, whether each should be traversed in
+        reverse, and a dict of the points of any join which follows a
+        boundary, by the position in the order of the strip it leads to
+    """
+    k = len(starts)
+    ends_xy = np.concatenate((pts[starts], pts[ends]))
+    remaining = np.ones(2 * k, dtype=bool)
+    order = np.empty(k, dtype=np.int64)
+    flipped = np.zeros(k, dtype=bool)
+    joins = {}
+    current = ends_xy[0] if start is None else np.asarray(start, dtype=float)
+    tree = None
+    if len(boundaries) > 0:
+        rings = [np.asarray(ring, dtype=float) for ring in boundaries]
+        tree, areas = boundary_tree(rings)
+
+    for n in range(k):
+        dist = np.linalg.norm(ends_xy - current, axis=1)
+        dist[~remaining] = np.inf
+        best = int(np.argmin(dist))
+        if tree is not None:
+            # Try the nearest few, then all, before following a boundary
+            ranked = np.argsort(dist, kind="stable")[:2 * (k - n)]
+            near = ranked[:CANDIDATES]
+            crossed = crossing(tree, areas, current, ends_xy[near])
+            if (crossed >= 0).all() and len(ranked) > len(near):
+                near = ranked
+                crossed = crossing(tree, areas, current, ends_xy[near])
+            clear = np.flatnonzero(crossed < 0)
+            if len(clear) > 0:
+                best = int(near[clear[0]])
+            else:
+                best = int(near[0])
+                joins[n] = route_join(current, ends_xy[best], rings, tree,
+                                      areas)
+        s = best % k
+        order[n] = s
+        flipped[s] = best >= k
+        current = ends_xy[(best + k) % (2 * k)]
+        remaining[[s, s + k]] = False
+
+    return order, flipped[order], joins
+
+
+def expand(pts,
+           starts,
+           ends,
+           order,
+           flipped,
+           endpoints_only=False,
+           joins=None):
+    """Expands ordered strips back into a route
+
+    Args:
+        pts: The points sorted into strip order
+        starts: The index of the first point of each strip
+        ends: The index of the last point of each strip
+        order: The order to traverse the strips
+        flipped: Whether each strip in order is traversed in reverse
+        endpoints_only: Only keep the ends of each strip, giving the
+            simplified route
+        joins: The points of joins which follow a boundary, from
+            order_strips
+
+    Returns:
+        The [x, y] points of the route
+    """
+    joins = joins or {}
+    if endpoints_only and not joins:
+        first = np.where(flipped, ends[order], starts[order])
+        last = np.where(flipped, starts[order], ends[order])
+        return pts[np.column_stack((first, last)).ravel()]
+
+    route = []
+    for n, (s, f) in enumerate(zip(order, flipped)):
+        if n in joins:
+            route.append(joins[n])
+        strip = pts[starts[s]:ends[s] + 1]
+        if endpoints_only:
+            strip = strip[[0, -1]]
+        route.append(strip[::-1] if f else strip)
+    if len(route) == 0:
+        return np.empty((0, 2))
+    return np.concatenate(route)
+
+
+def plan_strips(points,
+                height,
+                width,
+                overlap,
+                axis=0,
+                start=None,
+                endpoints_only=False,
+                boundaries=()):
+    """Plans a route over the strips of the lattice
+
+    Args:
+        points: The points from Quantise
+        height: The height of the robot
+        width: The width of the robot
+        overlap: The overlap used in Quantise
+        axis: 0 for left-right strips, 1 for up-down strips
+        start: The [x, y] position the route starts from
+        endpoints_only: Only keep the ends of each strip
+        boundaries: The closed rings joins between strips must not cross,
+            usually the inner perimeter and the outer nogos
+
+    Returns:
+        The [x, y] points of the route
+    """
+    pts, starts, ends = find_strips(points, height, width, overlap, axis)
+    if len(pts) == 0:
+        return np.empty((0, 2))
+    print("Planning " + str(len(starts)) + " strips from " + str(len(pts)) +
+          " points")
+    order, flipped, joins = order_strips(pts, starts, ends, start, boundaries)
+    return expand(pts, starts, ends, order, flipped, endpoints_only, joins)
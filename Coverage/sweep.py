@@ -0,0 +1,153 @@
+"""
+
+Selects the orientation of the lattice used by Quantise.
+
+Quantise lays the lattice along the UTM x/y axes, which for long
+diagonal lawns produces many more short rows, turns, and boundary
+cells than a lattice aligned to the lawn. This module scores a set of
+candidate rotations in parallel and returns the best one, the shapes
+are then rotated before Quantise and the route rotated back after.
+
+"""
+
+import math
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from matplotlib.path import Path
+from shapely.geometry import Polygon
+
+from optimise import TimeModel, turn_time
+from strips import find_strips
+
+
+def rotate(points, angle, origin):
+    """Rotates points anti-clockwise about an origin
+
+    Args:
+        points: The [x, y] points to rotate
+        angle: The angle in degrees
+        origin: The [x, y] point to rotate about
+
+    Returns:
+        The rotated points
+    """
+    points = np.asarray(points, dtype=float)
+    theta = math.radians(angle)
+    rot = np.array([[math.cos(theta), -math.sin(theta)],
+                    [math.sin(theta), math.cos(theta)]])
+    return (points - origin) @ rot.T + origin
+
+
+def _lattice(shape, height, width, overlap, nogos):
+    """A vectorised version of Quantise used for scoring
+
+    Returns:
+        The [x, y] lattice points inside the shape and outside the nogos
+    """
+    min_x, min_y = shape.min(axis=0) + [width / 2, height / 2]
+    max_x, max_y = shape.max(axis=0)
+    xs = np.arange(min_x, max_x, width * overlap)
+    ys = np.arange(min_y, max_y, height)
+    grid = np.stack(np.meshgrid(xs, ys), axis=-1).reshape(-1, 2)
+    inside = Path(shape).contains_points(grid)
+    for nogo in nogos:
+        inside &= ~Path(nogo).contains_points(grid)
+    return grid[inside]
+
+
+def score_angle(shape,
+                height,
+                width,
+                overlap,
+                nogos,
+                angle,
+                model=TimeModel(),
+                coarse=2.0):
+    """Scores a lattice orientation using cheap proxies for the route
+
+    The lattice is built at a coarser resolution to keep scoring fast,
+    the proxies are scaled back to the full resolution.
+
+    Args:
+        shape: The inner perimeter
+        height: The height of the robot
+        width: The width of the robot
+        overlap: The overlap used in Quantise
+        nogos: The outer nogo boundaries
+        angle: The lattice angle in degrees
+        model: The time model used to weigh turns against travel
+        coarse: The factor the lattice spacing is scaled by for scoring
+
+    Returns:
+        A dict of the number of strips, the turns, the cells lost at
+        the boundary, and the overall score in seconds (lower is better)
+    """
+    origin = shape.mean(axis=0)
+    r_shape = rotate(shape, -angle, origin)
+    r_nogos = [rotate(nogo, -angle, origin) for nogo in nogos]
+    h = height * coarse
+    w = width * coarse
+    points = _lattice(r_shape, h, w, overlap, r_nogos)
+    _, starts, _ = find_strips(points, h, w, overlap, axis=0)
+
+    cell = height * width * overlap
+    area = Polygon(shape).area - sum(Polygon(nogo).area for nogo in nogos)
+    cells = len(points) * coarse**2
+    strips = len(starts) * coarse
+    lost = max(area / cell - cells, 0.0)
+    turns = 2 * strips
+
+    # Straight travel over every cell, a half turn at the end of each
+    # strip, and the lost cells are assumed to need a pass of their own
+    travel = cells * width * overlap / model.speed
+    turning = turns * float(turn_time(math.pi / 2, model))
+    score = travel + turning + lost * width * overlap / model.speed * 2
+    return {
+        "angle": angle,
+        "strips": strips,
+        "turns": turns,
+        "lost": lost,
+        "score": score
+    }
+
+
+def _score(args):
+    return score_angle(*args)
+
+
+def best_angle(shape,
+               height,
+               width,
+               overlap,
+               nogos,
+               angles=range(0, 180, 15),
+               model=TimeModel(),
+               coarse=2.0,
+               workers=None):
+    """Finds the best lattice orientation from a set of candidates
+
+    Each candidate is scored in a separate process.
+
+    Args:
+        shape: The inner perimeter
+        height: The height of the robot
+        width: The width of the robot
+        overlap: The overlap used in Quantise
+        nogos: The outer nogo boundaries
+        angles: The candidate angles in degrees
+        model: The time model used to weigh turns against travel
+        coarse: The factor the lattice spacing is scaled by for scoring
+        workers: The number of processes, defaults to the CPU count
+
+    Returns:
+        The best angle in degrees and the scores of every candidate
+    """
+    jobs = [(shape, height, width, overlap, nogos, angle, model, coarse)
+            for angle in angles]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        scores = list(pool.map(_score, jobs))
+    best = min(scores, key=lambda s: s["score"])
+    print("Best sweep angle " + str(best["angle"]) + " degrees with " +
+          str(round(best["strips"])) + " strips")
+    return best["angle"], scores
@@ -0,0 +1,21 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+# The modules import each other by name, as when run from Coverage
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+
+@pytest.fixture
+def concave_lawn():
+    """An L-shaped lawn with a square nogo and a U-shaped nogo"""
+    perimeter = np.array([[0.0, 0.0], [30.0, 0.0], [30.0, 15.0], [18.0, 15.0],
+                          [18.0, 30.0], [0.0, 30.0]])
+    nogos = [
+        np.array([[4.0, 4.0], [7.0, 4.0], [7.0, 7.0], [4.0, 7.0]]),
+        np.array([[12.0, 3.0], [20.0, 3.0], [20.0, 11.0], [17.5, 11.0],
+                  [17.5, 5.5], [14.5, 5.5], [14.5, 11.0], [12.0, 11.0]])
+    ]
+    return perimeter, nogos
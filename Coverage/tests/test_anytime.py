@@ -0,0 +1,31 @@
+import time
+
+from anytime import AnytimePlan
+from coverage import inner_outer, perimeter_passes, quantise
+from validate import validate_route
+
+HEIGHT = WIDTH = 0.3
+OVERLAP = 0.75
+
+
+def test_pass_returns_within_budget(concave_lawn):
+    perimeter, nogos = concave_lawn
+    inner, outer_nogos = inner_outer(perimeter, nogos, WIDTH)
+    boundaries = [inner] + perimeter_passes(inner, outer_nogos)[1:]
+    lattice = quantise(inner, HEIGHT, WIDTH, OVERLAP, outer_nogos)
+    budget = 1.0
+    scores = []
+    began = time.monotonic()
+    route, score = AnytimePlan(
+        lattice,
+        HEIGHT,
+        WIDTH,
+        OVERLAP,
+        budget,
+        start=inner[-1],
+        on_improve=lambda route, score: scores.append(score),
+        boundaries=boundaries).wait()
+    assert time.monotonic() - began < budget + 0.5
+    assert scores[-1] == score and scores == sorted(scores, reverse=True)
+    problems = validate_route(route, perimeter, nogos)
+    assert len(problems["segments"]) == 0
@@ -0,0 +1,16 @@
+import numpy as np
+import shapely
+
+from coverage import close_shape, link_passes
+
+
+def test_nogo_pass_joins_with_a_clear_leg():
+    # A C-shaped pass whose nearest vertices lie behind its back wall
+    ring = close_shape(
+        np.array(
+            [[0, 0], [4, 0], [4, 1], [1, 1], [1, 3], [4, 3], [4, 4], [0, 4]],
+            dtype=float))
+    route = np.array([[-0.5, 2.0], [-0.5, 6.0]])
+    [(r, points)] = link_passes(route, [ring], [ring])
+    leg = shapely.LineString([route[r], points[0]])
+    assert not shapely.crosses(leg, shapely.LinearRing(ring))
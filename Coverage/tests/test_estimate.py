@@ -0,0 +1,21 @@
+import pytest
+
+from estimate import admit, estimate, stage
+
+HEIGHT = WIDTH = 0.3
+OVERLAP = 0.75
+
+
+def test_admit_raises_when_a_tile_does_not_fit():
+    cost = estimate(1e6, 0, HEIGHT, WIDTH, OVERLAP)
+    limit = cost["bytes"]["strips"] / 2
+    assert admit(cost, limit, use_strips=True)[0] == "tiled"
+    with pytest.raises(RuntimeError):
+        admit(cost, limit, use_strips=True, tile_bytes=limit * 2)
+
+
+def test_stage_records_peak_memory():
+    records = []
+    with stage("quantise", 10, records):
+        data = bytearray(10**6)
+    assert records[0]["bytes"] >= len(data)
@@ -0,0 +1,33 @@
+from collections import Counter
+
+import numpy as np
+
+from coverage import inner_outer, perimeter_passes, quantise
+from fleet import plan_fleet
+from validate import validate_route
+
+HEIGHT = WIDTH = 0.3
+OVERLAP = 0.75
+
+
+def test_each_robot_sweeps_both_axes_inside_the_lawn(concave_lawn):
+    perimeter, nogos = concave_lawn
+    inner, outer_nogos = inner_outer(perimeter, nogos, WIDTH)
+    passes = perimeter_passes(inner, outer_nogos)
+    lattice = quantise(inner, HEIGHT, WIDTH, OVERLAP, outer_nogos)
+    routes, report = plan_fleet(lattice,
+                                HEIGHT,
+                                WIDTH,
+                                OVERLAP,
+                                3,
+                                workers=1,
+                                start=passes[0][-1],
+                                boundaries=passes)
+    routes[0] = np.concatenate((passes[0], routes[0]))
+    for route in routes:
+        problems = validate_route(route, perimeter, nogos)
+        assert len(problems["segments"]) == 0
+    assert sum(report["cells"]) == len(lattice)
+    # Each lattice point is mown once on each pass
+    visits = Counter(map(tuple, np.concatenate(routes)))
+    assert all(visits[tuple(p)] >= 2 for p in lattice)
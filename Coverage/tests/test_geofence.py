@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+from shapely.geometry import Point, Polygon
+
+from geofence import Geofence
+from raster import pixel_centres
+
+
+def test_tiled_clearance_matches_shapes(concave_lawn):
+    perimeter, nogos = concave_lawn
+    res = 0.1
+    whole = Geofence.build(perimeter, nogos, res)
+    # Small enough that the lawn takes several tiles
+    tiled = Geofence.build(perimeter, nogos, res, memory_budget=100 * 1024**2)
+    assert np.array_equal(whole.bits, tiled.bits)
+    assert np.array_equal(whole.distance, tiled.distance)
+
+    area = Polygon(perimeter, [nogo for nogo in nogos])
+    rng = np.random.default_rng(0)
+    centres = pixel_centres((whole.origin, res, whole.shape))
+    for x, y in centres[rng.choice(len(centres), 500)]:
+        exact = area.exterior.distance(Point(x, y))
+        exact = min(
+            [exact] +
+            [Polygon(nogo).exterior.distance(Point(x, y)) for nogo in nogos])
+        found = abs(tiled.clearance(x, y))
+        assert found <= exact + res
+        assert found > min(exact, 255 * res) - 2 * res
+        assert tiled.contains(x, y) == area.contains(Point(x, y))
+
+
+def test_too_fine_to_fit_raises(concave_lawn):
+    perimeter, nogos = concave_lawn
+    with pytest.raises(MemoryError):
+        Geofence.build(perimeter, nogos, 0.001, memory_budget=1024**2)
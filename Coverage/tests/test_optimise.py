@@ -0,0 +1,33 @@
+import numpy as np
+
+from coverage import inner_outer, perimeter_passes, quantise
+from optimise import count_turns, reduce_turns, route_time
+from strips import plan_strips
+from validate import validate_route
+
+HEIGHT = WIDTH = 0.3
+OVERLAP = 0.75
+
+
+def test_reduce_turns_keeps_points_and_never_adds_turns(concave_lawn):
+    perimeter, nogos = concave_lawn
+    inner, outer_nogos = inner_outer(perimeter, nogos, WIDTH)
+    boundaries = [inner] + perimeter_passes(inner, outer_nogos)[1:]
+    lattice = quantise(inner, HEIGHT, WIDTH, OVERLAP, outer_nogos)
+    rng = np.random.default_rng(0)
+    for axis in (0, 1):
+        route = plan_strips(lattice,
+                            HEIGHT,
+                            WIDTH,
+                            OVERLAP,
+                            axis,
+                            boundaries=boundaries)
+        # Jitter the points so there are turns worth removing
+        route = route + rng.normal(0, 0.02, route.shape)
+        new = reduce_turns(route, boundaries=boundaries)
+        assert sorted(map(tuple, new)) == sorted(map(tuple, route))
+        assert np.array_equal(new[[0, -1]], route[[0, -1]])
+        assert count_turns(new) <= count_turns(route)
+        assert route_time(new) <= route_time(route)
+        problems = validate_route(new, perimeter, nogos)
+        assert len(problems["segments"]) == 0
@@ -0,0 +1,50 @@
+import numpy as np
+
+from plan import LATTICE, NOGO, PERIMETER, Plan, splice
+
+
+def test_runs_follow_appends_splices_and_close(tmp_path):
+    rng = np.random.default_rng(0)
+    plan = Plan()
+    xy, passes, kinds = [], [], []
+
+    def add(points, kind, pass_index):
+        xy.extend(points)
+        passes.extend([pass_index] * len(points))
+        kinds.extend([kind] * len(points))
+
+    points = rng.random((5, 2))
+    add(points, PERIMETER, plan.append(points, PERIMETER))
+    points = rng.random((7, 2))
+    n = plan.append(points, LATTICE)
+    add(points, LATTICE, n)
+    points = rng.random((3, 2))
+    add(points, LATTICE, plan.append(points, LATTICE, n))
+
+    # Detours at the start, the end, twice at one point, at the first
+    # point of a pass and with no points of their own
+    detours = [(0, rng.random((2, 2))), (4, rng.random((3, 2))),
+               (5, rng.random((1, 2))), (5, rng.random((2, 2))),
+               (9, np.empty((0, 2))), (14, rng.random((2, 2)))]
+    first = plan.next_pass()
+    plan.splice(detours, NOGO)
+    records = np.array(list(zip(passes, kinds)))
+    expect = splice(np.concatenate((np.array(xy), records), axis=1), [
+        (r, np.concatenate(
+            (p, np.tile([first + i, NOGO], (len(p), 1))), axis=1))
+        for i, (r, p) in enumerate(detours)
+    ])
+    plan.close()
+    expect = np.concatenate((expect, expect[:1]))
+
+    assert np.array_equal(plan.xy, expect[:, :2])
+    assert np.array_equal(plan.passes, expect[:, 2])
+    assert np.array_equal(plan.kinds, expect[:, 3])
+    change = np.flatnonzero(np.diff(expect[:, 2])) + 1
+    assert np.array_equal(plan.pass_starts(), np.concatenate(([0], change)))
+
+    plan.save(tmp_path / "plan.npz")
+    loaded = Plan.load(tmp_path / "plan.npz")
+    assert np.array_equal(loaded.xy, plan.xy)
+    assert np.array_equal(loaded.passes, plan.passes)
+    assert plan.buffer().nbytes == 16 * len(plan)
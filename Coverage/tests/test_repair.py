@@ -0,0 +1,60 @@
+import numpy as np
+
+from coverage import inner_outer, perimeter_passes, quantise
+from plan import splice
+from repair import find_detours, find_gaps
+from strips import plan_strips
+from validate import validate_route
+
+HEIGHT = WIDTH = 0.3
+OVERLAP = 0.75
+
+
+def test_detours_avoid_nogos(concave_lawn):
+    perimeter, nogos = concave_lawn
+    inner, outer_nogos = inner_outer(perimeter, nogos, WIDTH)
+    passes = perimeter_passes(inner, outer_nogos)
+    lattice = np.array(
+        list(quantise(inner, HEIGHT, WIDTH, OVERLAP, outer_nogos)))
+    # Leave out a band through both nogos and the inside of the U
+    kept = lattice[(lattice[:, 1] < 5) | (lattice[:, 1] > 8)]
+    route = np.concatenate((passes[0],
+                            plan_strips(kept,
+                                        HEIGHT,
+                                        WIDTH,
+                                        OVERLAP,
+                                        start=passes[0][-1],
+                                        boundaries=passes)))
+    detours, _ = find_detours(route, HEIGHT, WIDTH, OVERLAP, passes[0],
+                              passes[1:])
+    assert len(detours) > 0
+    problems = validate_route(splice(route, detours), perimeter, nogos)
+    assert len(problems["segments"]) == 0
+    assert len(problems["points"]) == 0
+
+
+def boustrophedon(ys, x0, x1):
+    """A route along rows at the given heights, alternating direction"""
+    rows = [[[x0, y], [x1, y]] if n % 2 == 0 else [[x1, y], [x0, y]]
+            for n, y in enumerate(ys)]
+    return np.concatenate(rows)
+
+
+def test_gap_between_rows_is_found():
+    square = np.array([[0, 0], [10, 0], [10, 10], [0, 10], [0, 0]],
+                      dtype=float)
+    # Rows reaching up to y = 4.85 and down to y = 5.15, leaving a gap
+    # 0.3 m wide, six pixels across, between them
+    below = 4.85 - WIDTH / 2 - np.arange(0, 4.9, 0.2)[::-1]
+    above = 5.15 + WIDTH / 2 + np.arange(0, 4.9, 0.2)
+    route = boustrophedon(np.concatenate((below, above)), -1, 11)
+    for memory_budget in (256 * 1024**2, 1024**2):
+        patches, coverage = find_gaps(route,
+                                      WIDTH,
+                                      square,
+                                      res=0.05,
+                                      memory_budget=memory_budget)
+        assert coverage < 0.98
+        gap = np.concatenate(patches)
+        assert (np.abs(gap[:, 1] - 5) < 0.2).all()
+        assert gap[:, 0].min() < 0.1 and gap[:, 0].max() > 9.9
@@ -0,0 +1,70 @@
+import numpy as np
+import shapely
+
+from coverage import inner_outer, perimeter_passes, quantise
+from streaming import stream_route
+from strips import around, boundary_tree, crossing, plan_strips
+from validate import validate_route
+
+HEIGHT = WIDTH = 0.3
+OVERLAP = 0.75
+
+
+def test_around_leaves_and_rejoins_the_move():
+    ring = np.array([[0, 0], [4, 0], [4, 4], [3, 4], [3, 1], [1, 1], [1, 4],
+                     [0, 4], [0, 0]],
+                    dtype=float)
+    p, q = np.array([-1.0, 2.0]), np.array([5.0, 2.0])
+    path = np.concatenate(([p], around(p, q, ring), [q]))
+    # The legs to and from the ring lie along the move
+    assert np.allclose(path[1], [0, 2]) and np.allclose(path[-2], [4, 2])
+    assert not shapely.crosses(shapely.LineString(path),
+                               shapely.LinearRing(ring))
+
+
+def test_strip_joins_avoid_concave_nogo(concave_lawn):
+    perimeter, nogos = concave_lawn
+    inner, outer_nogos = inner_outer(perimeter, nogos, WIDTH)
+    passes = perimeter_passes(inner, outer_nogos)
+    lattice = quantise(inner, HEIGHT, WIDTH, OVERLAP, outer_nogos)
+    for axis in (0, 1):
+        route = plan_strips(lattice,
+                            HEIGHT,
+                            WIDTH,
+                            OVERLAP,
+                            axis,
+                            start=passes[0][0],
+                            boundaries=passes)
+        problems = validate_route(route, perimeter, nogos)
+        assert len(problems["segments"]) == 0
+        assert len(problems["points"]) == 0
+
+
+def test_band_joins_avoid_concave_nogo(concave_lawn):
+    perimeter, nogos = concave_lawn
+    inner, outer_nogos = inner_outer(perimeter, nogos, WIDTH)
+    passes = perimeter_passes(inner, outer_nogos)
+    for axis in (0, 1):
+        # Narrow bands leave few clear joins, so more follow a boundary
+        route = np.concatenate(
+            list(
+                stream_route(passes[0],
+                             HEIGHT,
+                             WIDTH,
+                             OVERLAP,
+                             passes[1:],
+                             5,
+                             axis,
+                             start=passes[0][0])))
+        problems = validate_route(route, perimeter, nogos)
+        assert len(problems["segments"]) == 0
+
+
+def test_crossing_catches_chords_between_vertices():
+    perimeter = np.array(
+        [[-10, -10], [10, -10], [10, 10], [-10, 10], [-10, -10]], dtype=float)
+    nogo = np.array([[0, 0], [4, 0], [4, 4], [0, 4], [0, 0]], dtype=float)
+    tree, areas = boundary_tree([perimeter, nogo])
+    targets = np.array([[4, 4], [4, 0], [-1, -1], [20, 0]], dtype=float)
+    # Through the nogo, along its edge, clear, and out of the perimeter
+    assert crossing(tree, areas, nogo[0], targets).tolist() == [1, -1, -1, 0]
@@ -0,0 +1,26 @@
+import numpy as np
+
+from coverage import inner_outer, perimeter_passes
+from tiling import plan_tiled
+from validate import validate_route
+
+HEIGHT = WIDTH = 0.3
+OVERLAP = 0.75
+
+
+def test_tile_joins_avoid_nogos(concave_lawn):
+    perimeter, nogos = concave_lawn
+    inner, outer_nogos = inner_outer(perimeter, nogos, WIDTH)
+    passes = perimeter_passes(inner, outer_nogos)
+    for axis in (0, 1):
+        route = plan_tiled(passes[0],
+                           HEIGHT,
+                           WIDTH,
+                           OVERLAP,
+                           passes[1:],
+                           axis,
+                           tile_size=8,
+                           start=passes[0][-1])
+        route = np.concatenate((passes[0], route))
+        problems = validate_route(route, perimeter, nogos)
+        assert len(problems["segments"]) == 0
@@ -0,0 +1,258 @@
+"""
+
+Plans very large areas a tile at a time.
+
+At fine resolutions sports grounds and parkland produce millions of
+lattice points, far more than Quantise, the graph, and the TSP can
+hold in memory. Here the inner perimeter is split into tiles which
+are planned one at a time, or a few in parallel, under a memory
+budget. Each tile's route is written to disk and the tiles are then
+stitched together, so peak memory is bounded by the tile size rather
+than the size of the area.
+
+"""
+
+import math
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from matplotlib.path import Path
+
+from optimise import turn_angles
+from strips import boundary_tree, plan_strips, route_join
+
+# Rough peak bytes used per lattice cell while planning a tile
+BYTES_PER_CELL = 256
+
+
+def tile_lattice(shape, box, origin, height, width, overlap, nogos):
+    """Finds the lattice points of a shape that lie within a tile
+
+    The lattice is aligned to a global origin and each tile takes the
+    points in [min, max) of its box, so neighbouring tiles share the
+    same lattice and no point is planned twice.
+
+    Args:
+        shape: The inner perimeter
+        box: The tile's [min_x, min_y, max_x, max_y]
+        origin: The [x, y] of the first lattice point of the whole area
+        height: The height of the robot
+        width: The width of the robot
+        overlap: The desired overlap of the route
+        nogos: The outer nogo boundaries
+
+    Returns:
+        The [x, y] lattice points within the tile
+    """
+    step = np.array([width * overlap, height])
+    lo = np.ceil((np.asarray(box[:2]) - origin) / step).astype(np.int64)
+    hi = np.ceil((np.asarray(box[2:]) - origin) / step).astype(np.int64)
+    lo = np.maximum(lo, 0)
+    if (hi <= lo).any():
+        return np.empty((0, 2))
+    xs = origin[0] + np.arange(lo[0], hi[0]) * step[0]
+    ys = origin[1] + np.arange(lo[1], hi[1]) * step[1]
+    grid = np.stack(np.meshgrid(xs, ys), axis=-1).reshape(-1, 2)
+
+    inside = Path(shape).contains_points(grid)
+    for nogo in nogos:
+        n_min = nogo.min(axis=0)
+        n_max = nogo.max(axis=0)
+        if (n_max < box[:2]).any() or (n_min > box[2:]).any():
+            continue
+        inside &= ~Path(nogo).contains_points(grid)
+    return grid[inside]
+
+
+def tile_boxes(shape, tile_size):
+    """Splits the bounding box of a shape into square tiles
+
+    The tiles are returned in a snake order so that each tile is next
+    to the one before it.
+
+    Args:
+        shape: The inner perimeter
+        tile_size: The length of a tile's side in metres
+
+    Returns:
+        A list of [min_x, min_y, max_x, max_y] tiles
+    """
+    min_x, min_y = shape.min(axis=0)
+    max_x, max_y = shape.max(axis=0)
+    cols = max(1, math.ceil((max_x - min_x) / tile_size))
+    rows = max(1, math.ceil((max_y - min_y) / tile_size))
+    boxes = []
+    for r in range(rows):
+        order = range(cols) if r % 2 == 0 else reversed(range(cols))
+        for c in order:
+            boxes.append(
+                np.array([
+                    min_x + c * tile_size, min_y + r * tile_size,
+                    min_x + (c + 1) * tile_size, min_y + (r + 1) * tile_size
+                ]))
+    return boxes
+
+
+def tile_size_for_budget(height, width, overlap, memory_budget, workers):
+    """The side of a square tile which keeps planning within a budget
+
+    Args:
+        height: The height of the robot
+        width: The width of the robot
+        overlap: The desired overlap of the route
+        memory_budget: The memory available for planning in bytes
+        workers: The number of tiles planned at once
+
+    Returns:
+        The length of a tile's side in metres
+    """
+    cells = memory_budget / (BYTES_PER_CELL * workers)
+    return math.sqrt(cells * height * width * overlap)
+
+
+def _plan_tile(args):
+    """Plans one tile and writes its route to disk
+
+    Returns:
+        The path to the tile's route and the number of points in it
+    """
+    (n, shape, box, origin, height, width, overlap, nogos, axis, start,
+     spill_dir) = args
+    points = tile_lattice(shape, box, origin, height, width, overlap, nogos)
+    route = plan_strips(points,
+                        height,
+                        width,
+                        overlap,
+                        axis,
+                        start=start,
+                        boundaries=[shape] + list(nogos))
+    fname = os.path.join(spill_dir, "tile_" + str(n) + ".npy")
+    np.save(fname, route)
+    return fname, len(route)
+
+
+def plan_tiled(shape,
+               height,
+               width,
+               overlap,
+               nogos,
+               axis=0,
+               memory_budget=512 * 1024**2,
+               workers=1,
+               tile_size=None,
+               out_file=None,
+               start=None):
+    """Plans a route over a large area a tile at a time
+
+    Args:
+        shape: The inner perimeter
+        height: The height of the robot
+        width: The width of the robot
+        overlap: The desired overlap of the route
+        nogos: The outer nogo boundaries
+        axis: 0 for left-right strips, 1 for up-down strips
+        memory_budget: The memory available for planning in bytes
+        workers: The number of tiles planned at once
+        tile_size: The length of a tile's side in metres, defaults to the
+            largest tile that fits the memory budget
+        out_file: Where to write the stitched route, defaults to a
+            temporary file
+        start: The [x, y] position the route starts from, defaults to
+            the corner of the first tile
+
+    Returns:
+        The [x, y] points of the route, memory mapped from out_file
+    """
+    if tile_size is None:
+        tile_size = tile_size_for_budget(height, width, overlap, memory_budget,
+                                         workers)
+    boxes = tile_boxes(shape, tile_size)
+    origin = shape.min(axis=0) + [width / 2, height / 2]
+    rings = [shape] + list(nogos)
+    print("Planning " + str(len(boxes)) + " tiles of " +
+          str(round(tile_size, 1)) + " m")
+
+    with tempfile.TemporaryDirectory(prefix="tiles_") as spill_dir:
+        # Start each tile from the side nearest the tile before it
+        jobs = []
+        for n, box in enumerate(boxes):
+            if n > 0:
+                tile_start = (boxes[n - 1][:2] + boxes[n - 1][2:]) / 2
+            elif start is not None:
+                tile_start = np.asarray(start, dtype=float)
+            else:
+                tile_start = box[:2]
+            jobs.append((n, shape, box, origin, height, width, overlap, nogos,
+                         axis, tile_start, spill_dir))
+
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            tiles = [t for t in pool.map(_plan_tile, jobs) if t[1] > 0]
+
+        # Reverse a tile if its end is closer to the end of the route so
+        # far, and follow the boundaries where the join to it crosses one
+        tree, areas = boundary_tree(rings)
+        stitches = []
+        last = None if start is None else np.asarray(start, dtype=float)
+        for fname, length in tiles:
+            tile = np.load(fname, mmap_mode="r")
+            first, end = np.array(tile[0]), np.array(tile[-1])
+            del tile
+            join = np.empty((0, 2))
+            flip = False
+            if last is not None:
+                flip = (np.linalg.norm(end - last)
+                        < np.linalg.norm(first - last))
+                if flip:
+                    first, end = end, first
+                join = route_join(last, first, rings, tree, areas)
+            stitches.append((fname, length, flip, join))
+            last = end
+
+        if out_file is not None:
+            return _stitch(stitches, out_file)
+        # The mapping outlives the removal of its file
+        with tempfile.TemporaryDirectory(prefix="route_") as route_dir:
+            return _stitch(stitches, os.path.join(route_dir, "route.npy"))
+
+
+def _stitch(stitches, out_file):
+    """Writes the tiles and the joins between them into one route
+
+    Args:
+        stitches: A (file, length, reversed, join points) tuple per tile
+        out_file: Where to write the route
+
+    Returns:
+        The [x, y] points of the route, memory mapped from out_file
+    """
+    total = sum(length + len(join) for _, length, _, join in stitches)
+    route = np.lib.format.open_memmap(out_file, mode="w+", shape=(total, 2))
+    i = 0
+    for fname, length, flip, join in stitches:
+        route[i:i + len(join)] = join
+        i += len(join)
+        tile = np.load(fname, mmap_mode="r")
+        route[i:i + length] = tile[::-1] if flip else tile
+        i += length
+        del tile
+        os.remove(fname)
+    route.flush()
+    del route
+    return np.load(out_file, mmap_mode="r")
+
+
+def simplify(route):
+    """Keeps only the points where a route changes direction
+
+    Args:
+        route: The [x, y] points of the route
+
+    Returns:
+        The simplified route
+    """
+    keep = turn_angles(route) > 1e-6
+    keep[0] = True
+    keep[-1] = True
+    return np.asarray(route)[keep]
@@ -0,0 +1,275 @@
+"""
+
+Monte Carlo tuning of the traversal off-course detector.
+
+The detector in Traversal (map.c and queue.c) relies on hard-coded
+constants: the 0.15 m buffer, the 0.2 m arrival radius, QUEUE_LEN,
+the 0.6 on-course ratio, and MAX_SPEED. This module simulates noisy
+traversals of a route, some of which drift off course, and measures
+the false positive and false negative rates of the detector across a
+grid of noise amplitudes and detector parameters.
+
+The noise is generated once and shared with the worker processes
+through shared memory, each combination is evaluated in a process
+pool.
+
+"""
+
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+# The values currently used in Traversal
+DEFAULT_DETECTOR = {
+    "buffer": 0.15,
+    "arrival": 0.2,
+    "queue_len": 10,
+    "ratio": 0.6,
+    "max_speed": None
+}
+
+_shared = {}
+
+
+def truth_fixes(route, speed, rate):
+    """Samples positions along a route at a constant speed
+
+    Args:
+        route: The [x, y] points of the route
+        speed: The speed of the robot in m/s
+        rate: The number of fixes per second
+
+    Returns:
+        The [x, y] fixes and the unit normal of the route at each fix
+    """
+    seg = np.diff(route, axis=0)
+    seg_len = np.linalg.norm(seg, axis=1)
+    dist = np.concatenate(([0], np.cumsum(seg_len)))
+    s = np.arange(0, dist[-1], speed / rate)
+    fixes = np.column_stack(
+        (np.interp(s, dist, route[:, 0]), np.interp(s, dist, route[:, 1])))
+
+    # The segment each fix lies on, used for the direction of any drift
+    idx = np.clip(np.searchsorted(dist, s, side="right") - 1, 0, len(seg) - 1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        unit = seg[idx] / seg_len[idx, None]
+    unit = np.nan_to_num(unit)
+    normals = np.column_stack((-unit[:, 1], unit[:, 0]))
+    return fixes, normals
+
+
+def detect(route, fixes, buffer, arrival, queue_len, ratio, max_speed, dt):
+    """Runs the Traversal off-course detector over many traversals at once
+
+    Follows map.c and queue.c: the robot tracks its current line,
+    moves to the next line when within the arrival radius of the next
+    point, and is off course when the share of recent fixes within
+    the buffer drops below the ratio. If max_speed is given, fixes
+    which would need an impossible speed are ignored, as in the
+    is_possible check.
+
+    Args:
+        route: The [x, y] points of the route
+        fixes: The [runs, time, 2] positions of each traversal
+        buffer: The distance from the line before a fix is outside
+        arrival: The distance from the next point to count as arrived
+        queue_len: The number of fixes held in the queue
+        ratio: The share of fixes that must be inside to be on course
+        max_speed: The fastest possible speed in m/s, or None
+        dt: The time between fixes in seconds
+
+    Returns:
+        A [runs, time] array, True where the detector is off course
+    """
+    runs, steps, _ = fixes.shape
+    node = np.zeros(runs, dtype=np.int64)
+    last = len(route) - 1
+    outside = np.zeros((runs, steps), dtype=np.int8)
+
+    for t in range(steps):
+        p = fixes[:, t]
+        active = node < last
+        nxt = route[np.minimum(node + 1, last)]
+        arrived = active & (((p - nxt)**2).sum(axis=1) < arrival**2)
+        node = node + arrived
+
+        a = route[np.minimum(node, last)]
+        b = route[np.minimum(node + 1, last)]
+        d = b - a
+        length = np.linalg.norm(d, axis=1)
+        cross = np.abs(d[:, 0] * (p[:, 1] - a[:, 1]) - d[:, 1] *
+                       (p[:, 0] - a[:, 0]))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            dist = np.where(length > 0, cross / length,
+                            np.linalg.norm(p - a, axis=1))
+        out = (dist > buffer) & (node < last)
+
+        if max_speed is not None and t > 0:
+            jump = np.linalg.norm(p - fixes[:, t - 1], axis=1)
+            out &= jump / dt <= max_speed
+        outside[:, t] = out
+
+    # Share of the last queue_len fixes which were inside, the queue
+    # starts empty (all inside) as in the Traversal harness
+    padded = np.concatenate((np.zeros(
+        (runs, queue_len), dtype=np.int64), outside),
+                            axis=1)
+    total = np.cumsum(padded, axis=1)
+    in_queue = total[:, queue_len:] - total[:, :-queue_len]
+    return (queue_len - in_queue) / queue_len < ratio
+
+
+def _share(arrays):
+    """Copies arrays into shared memory
+
+    Returns:
+        The shared memory blocks and a description of each array
+    """
+    blocks = []
+    descs = {}
+    for name, arr in arrays.items():
+        shm = shared_memory.SharedMemory(create=True, size=max(arr.nbytes, 1))
+        np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)[...] = arr
+        blocks.append(shm)
+        descs[name] = (shm.name, arr.shape, arr.dtype.str)
+    return blocks, descs
+
+
+def _attach(descs):
+    """Attaches a worker process to the shared arrays"""
+    for name, (shm_name, shape, dtype) in descs.items():
+        shm = shared_memory.SharedMemory(name=shm_name)
+        _shared[name] = (shm, np.ndarray(shape, dtype=dtype, buffer=shm.buf))
+
+
+def _evaluate(args):
+    """Evaluates one noise amplitude and detector setting
+
+    Returns:
+        A dict of the parameters and the resulting rates
+    """
+    amplitude, params, dt, drift_rate, off_distance = args
+    route = _shared["route"][1]
+    truth = _shared["truth"][1]
+    normals = _shared["normals"][1]
+    noise = _shared["noise"][1]
+    onset = _shared["onset"][1]
+
+    steps = len(truth)
+    t = np.arange(steps)
+    drift = np.clip(t[None, :] - onset[:, None], 0, None) * dt * drift_rate
+    drift[onset < 0] = 0
+    fixes = (truth[None] + noise * amplitude +
+             drift[..., None] * normals[None])
+
+    flags = detect(route, fixes, dt=dt, **params)
+
+    clean = onset < 0
+    off = drift > off_distance
+    flagged_off = (flags & off).any(axis=1)
+    first_off = np.where(off.any(axis=1), off.argmax(axis=1), steps)
+    first_flag = np.where(flags & off, t[None, :], steps).min(axis=1)
+    drifting = ~clean & (first_off < steps)
+
+    result = {"amplitude": amplitude}
+    result.update(params)
+    result["false_positive"] = float(flags[clean].any(
+        axis=1).mean()) if clean.any() else 0.0
+    result["false_negative"] = float(
+        (~flagged_off[drifting]).mean()) if drifting.any() else 0.0
+    latency = (first_flag - first_off)[drifting & flagged_off] * dt
+    result["latency"] = float(latency.mean()) if len(latency) else np.nan
+    return result
+
+
+def sweep(route,
+          amplitudes,
+          grid,
+          runs=200,
+          speed=0.6,
+          rate=10,
+          drift_rate=0.1,
+          off_distance=0.3,
+          workers=None,
+          seed=0):
+    """Evaluates the detector across noise amplitudes and parameters
+
+    Half of the simulated traversals drift sideways off the route from a
+    random time, these should be detected once the drift is more than
+    off_distance. The other half stay on the route and should never be
+    flagged.
+
+    Args:
+        route: The [x, y] points of the route
+        amplitudes: The noise amplitudes in metres, noise is uniform in
+            [-amplitude, amplitude] as in the generated test routes
+        grid: A dict mapping each detector parameter to the values to try,
+            missing parameters use DEFAULT_DETECTOR
+        runs: The number of simulated traversals
+        speed: The speed of the robot in m/s
+        rate: The number of fixes per second
+        drift_rate: The speed the drifting traversals leave the route, m/s
+        off_distance: Drift beyond this distance, in metres, is off course
+        workers: The number of processes, defaults to the CPU count
+        seed: The random seed
+
+    Returns:
+        A list of dicts, one per combination, with the false positive and
+        false negative rates and the mean detection latency
+    """
+    route = np.asarray(route, dtype=float)
+    rng = np.random.default_rng(seed)
+    truth, normals = truth_fixes(route, speed, rate)
+    steps = len(truth)
+    noise = rng.uniform(-1, 1, (runs, steps, 2))
+    onset = np.where(
+        np.arange(runs) % 2 == 0, -1, rng.integers(0, max(steps // 2, 1),
+                                                   runs))
+    print("Simulating " + str(runs * steps * len(amplitudes)) + " fixes")
+
+    keys = list(DEFAULT_DETECTOR)
+    values = [grid.get(k, [DEFAULT_DETECTOR[k]]) for k in keys]
+    jobs = [(amplitude, dict(zip(keys,
+                                 combo)), 1 / rate, drift_rate, off_distance)
+            for amplitude in amplitudes
+            for combo in itertools.product(*values)]
+
+    blocks, descs = _share({
+        "route": route,
+        "truth": truth,
+        "normals": normals,
+        "noise": noise,
+        "onset": onset
+    })
+    try:
+        with ProcessPoolExecutor(max_workers=workers,
+                                 initializer=_attach,
+                                 initargs=(descs, )) as pool:
+            results = list(pool.map(_evaluate, jobs))
+    finally:
+        for shm in blocks:
+            shm.close()
+            shm.unlink()
+
+    return results
+
+
+def main():
+    route = np.loadtxt("./out_route.out", dtype=float, delimiter=",")
+    results = sweep(
+        route, [0.05, 0.1, 0.2, 0.5], {
+            "buffer": [0.1, 0.15, 0.2, 0.3],
+            "arrival": [0.2, 0.3],
+            "queue_len": [5, 10, 20],
+            "ratio": [0.5, 0.6, 0.7]
+        })
+    results.sort(key=lambda r:
+                 (r["amplitude"], r["false_positive"] + r["false_negative"]))
+    for r in results:
+        print(r)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+
+Checks a route never leaves the lawn or enters a nogo zone.
+
+Every segment of the route is tested against the edges of the original
+perimeter and the nogo zones. Candidate pairs are found with an
+STRtree of the route's segments, then tested with a vectorised
+segment intersection, so the check is fast enough to run on every plan
+before it is uploaded.
+
+"""
+
+import numpy as np
+import shapely
+from matplotlib.path import Path
+
+
+def ring_edges(rings):
+    """Splits closed rings into their edges
+
+    Args:
+        rings: A list of closed [x, y] rings
+
+    Returns:
+        The [n, 2, 2] edges and the index of the ring each came from
+    """
+    edges = []
+    owner = []
+    for i, ring in enumerate(rings):
+        ring = np.asarray(ring, dtype=float)
+        if not (ring[0] == ring[-1]).all():
+            ring = np.append(ring, [ring[0]], axis=0)
+        edges.append(np.stack((ring[:-1], ring[1:]), axis=1))
+        owner.append(np.full(len(ring) - 1, i))
+    return np.concatenate(edges), np.concatenate(owner)
+
+
+def intersect(a, b, tol=0.0):
+    """Vectorised intersection of pairs of segments
+
+    Parallel segments are treated as not intersecting.
+
+    Args:
+        a: The [n, 2, 2] first segments
+        b: The [n, 2, 2] second segments
+        tol: How far past its ends, as a share of its length, each
+            segment may be met
+
+    Returns:
+        Whether each pair intersects, and the [x, y] of the intersection
+    """
+    p = a[:, 0]
+    r = a[:, 1] - p
+    q = b[:, 0]
+    s = b[:, 1] - q
+    denom = r[:, 0] * s[:, 1] - r[:, 1] * s[:, 0]
+    qp = q - p
+    with np.errstate(invalid="ignore", divide="ignore"):
+        t = (qp[:, 0] * s[:, 1] - qp[:, 1] * s[:, 0]) / denom
+        u = (qp[:, 0] * r[:, 1] - qp[:, 1] * r[:, 0]) / denom
+    hit = ((denom != 0) & (t >= -tol) & (t <= 1 + tol) & (u >= -tol) &
+           (u <= 1 + tol))
+    return hit, p + np.where(hit, t, 0)[:, None] * r
+
+
+def validate_route(route, perimeter, nogos=()):
+    """Finds the segments of a route that cross the perimeter or a nogo
+
+    Args:
+        route: The [x, y] points of the route
+        perimeter: The original perimeter
+        nogos: The original nogo zones
+
+    Returns:
+        A dict of the offending segment indices, the boundary each
+        crosses (0 for the perimeter, i + 1 for nogo i), the [x, y]
+        location of each crossing, and the indices of any route points
+        outside the perimeter or inside a nogo zone
+    """
+    route = np.asarray(route, dtype=float)
+    segments = np.stack((route[:-1], route[1:]), axis=1)
+    edges, owner = ring_edges([perimeter] + list(nogos))
+
+    tree = shapely.STRtree(shapely.linestrings(segments))
+    edge_idx, seg_idx = tree.query(shapely.linestrings(edges))
+    hit, where = intersect(segments[seg_idx], edges[edge_idx])
+
+    outside = ~Path(perimeter).contains_points(route)
+    for nogo in nogos:
+        outside |= Path(nogo).contains_points(route)
+
+    problems = {
+        "segments": seg_idx[hit],
+        "boundary": owner[edge_idx[hit]],
+        "locations": where[hit],
+        "points": np.flatnonzero(outside)
+    }
+    print("Validated " + str(len(segments)) + " segments, " +
+          str(len(np.unique(problems["segments"]))) + " cross a boundary, " +
+          str(len(problems["points"])) + " points out of bounds")
+    return problems